@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+
+import boto3
+
+logger = logging.getLogger()
+
+# Change feed configuration
+CHANGE_FEED_BACKEND = os.environ.get('CHANGE_FEED_BACKEND', 'none')  # none | local | s3
+CHANGE_FEED_BUCKET = os.environ.get('CHANGE_FEED_BUCKET')
+CHANGE_FEED_PREFIX = os.environ.get('CHANGE_FEED_PREFIX', 'changes/')
+CHANGE_FEED_DIR = os.environ.get('CHANGE_FEED_DIR', '/tmp/change-feed')
+# Flushed records are split into segments of at most this size (a single
+# larger record gets a segment of its own)
+CHANGE_FEED_SEGMENT_BYTES = int(os.environ.get('CHANGE_FEED_SEGMENT_BYTES', str(1024 * 1024)))
+# Readers skip segments younger than this, so a segment named earlier but
+# written later by a concurrent writer is never passed over
+CHANGE_FEED_SETTLE_SECONDS = int(os.environ.get('CHANGE_FEED_SETTLE_SECONDS', '30'))
+
+SEGMENT_SUFFIX = '.ndjson'
+
+
+def is_change_feed_key(bucket, object_key):
+    """
+    True for segment objects, which must not be indexed as photos. Only
+    keys in the bucket the s3 feed writes to count, so photos under the
+    same prefix elsewhere (or with the feed off) are still indexed.
+    """
+    return (CHANGE_FEED_BACKEND == 's3' and bucket == CHANGE_FEED_BUCKET
+            and object_key.startswith(CHANGE_FEED_PREFIX))
+
+
+class LocalSegmentStore:
+    """
+    Segments as files in a local directory.
+    Stand-in for the S3 store in local runs and tests.
+    """
+
+    def __init__(self, directory=CHANGE_FEED_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, name, data):
+        tmp_path = os.path.join(self.directory, f".{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+    def list(self, after=None):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX))
+        return [name for name in names if after is None or name > after]
+
+    def get(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+
+class S3SegmentStore:
+    """
+    Segments as objects under CHANGE_FEED_PREFIX; listing with StartAfter
+    returns only segments newer than the reader's offset.
+    """
+
+    def __init__(self, bucket=CHANGE_FEED_BUCKET, prefix=CHANGE_FEED_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3')
+
+    def put(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=data,
+                               ContentType='application/x-ndjson')
+
+    def list(self, after=None):
+        params = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        if after:
+            params['StartAfter'] = self.prefix + after
+        names = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(**params):
+            names.extend(obj['Key'][len(self.prefix):] for obj in page.get('Contents', []))
+        return names
+
+    def get(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)['Body'].read()
+
+
+class ChangeFeedWriter:
+    """
+    Buffers change records and writes them as immutable NDJSON segments.
+    Segment names start with the zero-padded write time in milliseconds,
+    so name order is time order; the writer id and a counter keep names
+    from concurrent writers (Lambda containers) unique.
+    """
+
+    def __init__(self, store, segment_bytes=CHANGE_FEED_SEGMENT_BYTES):
+        self.store = store
+        self.segment_bytes = segment_bytes
+        self.writer_id = uuid.uuid4().hex[:12]
+        self.counter = 0
+        self.lines = []
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def append(self, record):
+        """Buffer a record; nothing is written until flush()."""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.lines.append(line)
+            self.size += len(line)
+
+    def flush(self):
+        """
+        Write all buffered records as segments of up to segment_bytes.
+        If a write fails, the records not yet written stay buffered.
+        """
+        with self.lock:
+            while self.lines:
+                self.write_segment()
+
+    def write_segment(self):
+        """Write the oldest buffered records as one segment (lock held)."""
+        count = size = 0
+        for line in self.lines:
+            if count and size + len(line) > self.segment_bytes:
+                break
+            count += 1
+            size += len(line)
+        self.counter += 1
+        name = f"{int(time.time() * 1000):013d}-{self.writer_id}-{self.counter:06d}{SEGMENT_SUFFIX}"
+        self.store.put(name, ''.join(self.lines[:count]).encode('utf-8'))
+        logger.info(f"Change feed segment {name}: {count} records")
+        self.lines = self.lines[count:]
+        self.size -= size
+
+
+def make_change_record(document, doc_id):
+    """
+    Compact change record for an applied write: op (upsert, update or
+    delete), document id, bucket, key, labels (not for deletes), the
+    write time and the S3 sequencer as the per-key sequence.
+    """
+    if document.get('deleted'):
+        op = 'delete'
+    elif 'partialUpdate' in document:
+        op = 'update'
+    else:
+        op = 'upsert'
+    record = {
+        'op': op,
+        'id': doc_id,
+        'bucket': document['bucket'],
+        'key': document['objectKey'],
+        'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+    }
+    if op != 'delete':
+        record['labels'] = document.get('partialUpdate', document).get('labels', [])
+    if document.get('s3Sequencer'):
+        record['seq'] = document['s3Sequencer']
+    return record
+
+
+def parse_offset(offset):
+    """Split 'segment:line' into (segment, line); None means the start."""
+    if not offset:
+        return None, 0
+    segment, _, line = offset.rpartition(':')
+    return segment, int(line)
+
+
+def read_changes(store, offset=None, limit=1000, settle_seconds=CHANGE_FEED_SETTLE_SECONDS):
+    """
+    Read change records after an offset.
+    Returns (records, next_offset); store next_offset and pass it back to
+    continue. Offsets are 'segment:line' strings; records in segments
+    younger than settle_seconds are left for a later call.
+    """
+    segment, line = parse_offset(offset)
+    cutoff = f"{int((time.time() - settle_seconds) * 1000):013d}"
+    records = []
+    next_offset = offset
+
+    names = ([segment] if segment else []) + store.list(after=segment)
+    for name in names:
+        if name != segment and name[:13] > cutoff:
+            break
+        lines = store.get(name).decode('utf-8').splitlines()
+        start = line if name == segment else 0
+        for index in range(start, len(lines)):
+            if len(records) >= limit:
+                return records, next_offset
+            records.append(json.loads(lines[index]))
+            next_offset = f"{name}:{index + 1}"
+        next_offset = f"{name}:{len(lines)}"
+    return records, next_offset
+
+
+def create_segment_store(backend=CHANGE_FEED_BACKEND):
+    """
+    Create the segment store selected by CHANGE_FEED_BACKEND.
+    Returns None when the change feed is disabled.
+    """
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalSegmentStore()
+    if backend == 's3':
+        if not CHANGE_FEED_BUCKET:
+            raise ValueError("CHANGE_FEED_BUCKET is required for the s3 change feed")
+        return S3SegmentStore()
+    raise ValueError(f"Unknown CHANGE_FEED_BACKEND: {backend}")
+
+
+def create_change_feed(backend=CHANGE_FEED_BACKEND):
+    """Create the feed writer, or None when the change feed is disabled."""
+    store = create_segment_store(backend)
+    return ChangeFeedWriter(store) if store is not None else None
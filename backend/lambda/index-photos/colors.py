@@ -0,0 +1,132 @@
+import io
+import os
+import logging
+
+from image_preprocess import get_object_bytes
+
+logger = logging.getLogger()
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+# Dominant colour configuration
+COLORS_ENABLED = os.environ.get('COLORS_ENABLED', 'false').lower() == 'true'
+# Pixels are sampled from a thumbnail no larger than this on either side
+COLOR_SAMPLE_SIZE = int(os.environ.get('COLOR_SAMPLE_SIZE', '64'))
+# Minimum share of pixels for a named colour to be stored in 'colors'
+COLOR_MIN_FRACTION = float(os.environ.get('COLOR_MIN_FRACTION', '0.1'))
+# Minimum share of pixels for a histogram bin to be stored in 'paletteBins'
+COLOR_BIN_MIN_FRACTION = float(os.environ.get('COLOR_BIN_MIN_FRACTION', '0.05'))
+PALETTE_SIZE = int(os.environ.get('PALETTE_SIZE', '5'))
+
+# Named colours searchable by word; search-photos uses the same names
+COLOR_NAMES = {
+    'black': (0, 0, 0),
+    'gray': (128, 128, 128),
+    'white': (255, 255, 255),
+    'red': (200, 30, 30),
+    'orange': (240, 130, 20),
+    'yellow': (240, 220, 40),
+    'green': (50, 150, 50),
+    'teal': (0, 128, 128),
+    'blue': (40, 90, 210),
+    'purple': (120, 50, 160),
+    'pink': (240, 130, 180),
+    'brown': (130, 80, 40),
+}
+
+# The histogram quantizes each RGB channel to 4 levels (64 bins); a bin id
+# is its three levels as digits, e.g. '302' (search-photos maps hex colours
+# to the same ids)
+BIN_LEVELS = 4
+BIN_SHIFT = 6
+
+
+def color_histogram(pixels):
+    """
+    Named-colour and quantized-bin histograms of an (N, 3) pixel array.
+    Every pixel is assigned to its nearest named colour using the
+    'redmean' weighted RGB distance, in one vectorized pass.
+    Returns (named fractions, bin fractions) as float arrays.
+    """
+    pixels = pixels.astype(np.float32)
+    palette = np.array(list(COLOR_NAMES.values()), dtype=np.float32)
+
+    diff = pixels[:, None, :] - palette[None, :, :]
+    rmean = (pixels[:, None, 0] + palette[None, :, 0]) / 2
+    distance = (
+        (2 + rmean / 256) * diff[..., 0] ** 2
+        + 4 * diff[..., 1] ** 2
+        + (2 + (255 - rmean) / 256) * diff[..., 2] ** 2
+    )
+    named = np.bincount(distance.argmin(axis=1), minlength=len(palette)) / len(pixels)
+
+    levels = pixels.astype(np.uint8) >> BIN_SHIFT
+    bin_ids = (levels[:, 0].astype(np.int32) * BIN_LEVELS + levels[:, 1]) * BIN_LEVELS + levels[:, 2]
+    bins = np.bincount(bin_ids, minlength=BIN_LEVELS ** 3) / len(pixels)
+    return named, bins, bin_ids
+
+
+def bin_name(bin_id):
+    r, rest = divmod(int(bin_id), BIN_LEVELS * BIN_LEVELS)
+    g, b = divmod(rest, BIN_LEVELS)
+    return f"{r}{g}{b}"
+
+
+def compute_colors(data):
+    """
+    Compute compact colour fields from image bytes:
+    colors (named colours covering at least COLOR_MIN_FRACTION),
+    palette (hex means of the PALETTE_SIZE largest bins),
+    paletteBins (bin ids covering at least COLOR_BIN_MIN_FRACTION) and
+    colorHistogram (percent per named colour, in COLOR_NAMES order).
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', (COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+    image = image.convert('RGB')
+    image.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+    pixels = np.asarray(image).reshape(-1, 3)
+
+    named, bins, bin_ids = color_histogram(pixels)
+    names = list(COLOR_NAMES)
+    colors = [names[i] for i in np.argsort(-named) if named[i] >= COLOR_MIN_FRACTION]
+
+    # Mean colour of each bin, for a palette closer to the actual pixels
+    counts = np.bincount(bin_ids, minlength=BIN_LEVELS ** 3)
+    sums = np.stack([
+        np.bincount(bin_ids, weights=pixels[:, channel], minlength=BIN_LEVELS ** 3)
+        for channel in range(3)
+    ], axis=1)
+    order = [i for i in np.argsort(-bins) if counts[i]]
+    palette = [
+        '#' + ''.join(f"{int(round(v)):02x}" for v in sums[i] / counts[i])
+        for i in order[:PALETTE_SIZE]
+    ]
+    palette_bins = [bin_name(i) for i in order if bins[i] >= COLOR_BIN_MIN_FRACTION]
+
+    return {
+        'colors': colors,
+        'palette': palette,
+        'paletteBins': palette_bins,
+        'colorHistogram': [int(round(fraction * 100)) for fraction in named]
+    }
+
+
+def extract_colors(bucket, object_key):
+    """
+    Return an image's colour fields (shared download); empty when
+    disabled, NumPy or Pillow is unavailable, or on error.
+    """
+    if not COLORS_ENABLED or np is None:
+        return {}
+    try:
+        fields = compute_colors(get_object_bytes(bucket, object_key))
+    except Exception as e:
+        logger.warning(f"Error extracting colours from {object_key}: {str(e)}")
+        return {}
+    logger.info(f"Colours for {object_key}: {fields['colors']} {fields['palette']}")
+    return fields
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Deadline configuration
+# Time kept back from the Lambda timeout for logging and the response
+DEADLINE_SAFETY_MS = int(os.environ.get('DEADLINE_SAFETY_MS', '500'))
+# boto3 has no per-request timeout, so every SDK call is bounded by these
+# socket timeouts (and call_with_retry stops retrying at the deadline)
+SDK_CONNECT_TIMEOUT = float(os.environ.get('SDK_CONNECT_TIMEOUT', '2'))
+SDK_READ_TIMEOUT = float(os.environ.get('SDK_READ_TIMEOUT', '10'))
+
+deadline_context = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """The time budget ran out; the work should be handed back for retry."""
+
+
+class Deadline:
+    """
+    Point in time (monotonic clock) by which work must finish.
+    A Deadline created without seconds never expires, so code run outside
+    Lambda (scripts, benchmarks) behaves as before.
+    """
+
+    def __init__(self, seconds=None):
+        self.expires_at = None if seconds is None else time.monotonic() + max(seconds, 0)
+
+    @classmethod
+    def from_context(cls, context, safety_ms=DEADLINE_SAFETY_MS):
+        """Deadline from a Lambda context's remaining time (unbounded without one)."""
+        get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        if get_remaining is None:
+            return cls()
+        return cls((get_remaining() - safety_ms) / 1000)
+
+    def remaining(self):
+        """Seconds left, or None when unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def has(self, seconds):
+        """True if at least this many seconds are left."""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def shortened(self, seconds):
+        """A deadline ending this many seconds earlier (e.g. to reserve time for a final write)."""
+        if self.expires_at is None:
+            return Deadline()
+        deadline = Deadline()
+        deadline.expires_at = self.expires_at - seconds
+        return deadline
+
+    def limit(self, seconds):
+        """A sub-budget ending in this many seconds, or at this deadline if sooner."""
+        deadline = Deadline(seconds)
+        if self.expires_at is not None:
+            deadline.expires_at = min(deadline.expires_at, self.expires_at)
+        return deadline
+
+    def timeout(self, limit=None):
+        """
+        Timeout for one call: the stage's own limit capped by the time
+        left. Raises DeadlineExceeded when no time is left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return limit
+        if remaining <= 0:
+            raise DeadlineExceeded("deadline reached")
+        return remaining if limit is None else min(limit, remaining)
+
+
+NO_DEADLINE = Deadline()
+
+
+def get_current_deadline():
+    return getattr(deadline_context, 'deadline', NO_DEADLINE)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Run the enclosed calls under a deadline (picked up by call_with_retry and the executors)."""
+    previous = get_current_deadline()
+    deadline_context.deadline = deadline
+    try:
+        yield
+    finally:
+        deadline_context.deadline = previous
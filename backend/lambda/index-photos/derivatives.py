@@ -0,0 +1,155 @@
+import io
+import os
+import logging
+
+import boto3
+from botocore.config import Config
+
+from deadline import SDK_CONNECT_TIMEOUT, SDK_READ_TIMEOUT
+from image_preprocess import get_object_bytes
+from throttling import call_with_retry, get_limiter
+
+logger = logging.getLogger()
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+    ImageOps = None
+    features = None
+
+s3_client = boto3.client('s3', config=Config(retries={'total_max_attempts': 1},
+                                             connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT))
+s3_limiter = get_limiter('s3')
+
+# Derivative rendition configuration
+DERIVATIVES_ENABLED = os.environ.get('DERIVATIVES_ENABLED', 'false').lower() == 'true'
+# Renditions written to the photos bucket itself would each trigger
+# another index-photos invocation (S3 notifications cannot exclude a
+# prefix), so a separate bucket without notifications is preferred;
+# unset keeps them under DERIVATIVES_PREFIX in the source bucket
+DERIVATIVES_BUCKET = os.environ.get('DERIVATIVES_BUCKET')
+DERIVATIVES_PREFIX = os.environ.get('DERIVATIVES_PREFIX', 'derivatives/')
+DERIVATIVE_WIDTHS = [
+    int(w) for w in os.environ.get('DERIVATIVE_WIDTHS', '320,640,1280').split(',') if w.strip()
+]
+DERIVATIVE_FORMATS = [
+    f.strip().lower() for f in os.environ.get('DERIVATIVE_FORMATS', 'jpeg,webp').split(',') if f.strip()
+]
+DERIVATIVE_QUALITY = int(os.environ.get('DERIVATIVE_QUALITY', '80'))
+DERIVATIVE_CACHE_CONTROL = os.environ.get('DERIVATIVE_CACHE_CONTROL', 'public, max-age=31536000, immutable')
+
+FORMAT_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+FORMAT_CONTENT_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+def is_derivative_key(bucket, object_key):
+    """
+    True for objects written by this stage; they must not be indexed
+    (or the derivative writes would re-trigger ingestion). Only keys in
+    the bucket renditions are written to count, so photos under the same
+    prefix elsewhere (or with derivatives off) are still indexed.
+    """
+    return (DERIVATIVES_ENABLED and get_derivatives_bucket(bucket) == bucket
+            and object_key.startswith(DERIVATIVES_PREFIX))
+
+
+def get_derivatives_bucket(bucket):
+    """Bucket that holds the renditions of objects in bucket."""
+    return DERIVATIVES_BUCKET or bucket
+
+
+def get_derivative_key(object_key, width, fmt):
+    return f"{DERIVATIVES_PREFIX}{width}/{object_key}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def get_output_formats():
+    """Configured formats this Pillow build can encode."""
+    formats = [fmt for fmt in DERIVATIVE_FORMATS if fmt in FORMAT_EXTENSIONS]
+    if 'webp' in formats and not features.check('webp'):
+        formats.remove('webp')
+    return formats
+
+
+def render_derivatives(data, widths, formats):
+    """
+    Render fixed-width renditions of image bytes.
+    The image is decoded once (in JPEG draft mode at the largest width) and
+    resized from the largest to the smallest rendition. Widths at or above
+    the source width are skipped. Returns dict of (width, format) -> bytes.
+    """
+    image = Image.open(io.BytesIO(data))
+    max_width = max(widths)
+    image.draft('RGB', (max_width, max_width))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    renditions = {}
+    for width in sorted(widths, reverse=True):
+        if width >= image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt.upper(), quality=DERIVATIVE_QUALITY)
+            renditions[(width, fmt)] = buffer.getvalue()
+    return renditions
+
+
+def generate_derivatives(bucket, object_key):
+    """
+    Create web-size renditions of an image under DERIVATIVES_PREFIX in
+    the derivatives bucket (see get_derivatives_bucket).
+    Returns dict mapping width (as a string) to {format: key}, suitable
+    for the document's 'derivatives' field; empty when disabled,
+    Pillow is unavailable, or rendering fails.
+    """
+    if not DERIVATIVES_ENABLED or Image is None:
+        return {}
+
+    try:
+        renditions = render_derivatives(get_object_bytes(bucket, object_key), DERIVATIVE_WIDTHS,
+                                        get_output_formats())
+    except Exception as e:
+        logger.warning(f"Error rendering derivatives for {object_key}: {str(e)}")
+        return {}
+
+    derivatives = {}
+    for (width, fmt), body in renditions.items():
+        key = get_derivative_key(object_key, width, fmt)
+        try:
+            call_with_retry(
+                s3_limiter,
+                s3_client.put_object,
+                Bucket=get_derivatives_bucket(bucket),
+                Key=key,
+                Body=body,
+                ContentType=FORMAT_CONTENT_TYPES[fmt],
+                CacheControl=DERIVATIVE_CACHE_CONTROL
+            )
+        except Exception as e:
+            logger.warning(f"Error writing derivative {key}: {str(e)}")
+            continue
+        derivatives.setdefault(str(width), {})[fmt] = key
+    logger.info(f"Derivatives for {object_key}: {derivatives}")
+    return derivatives
+
+
+def delete_derivatives(bucket, object_key):
+    """
+    Best-effort removal of all configured renditions of a deleted object.
+    """
+    if not DERIVATIVES_ENABLED:
+        return
+    keys = [
+        {'Key': get_derivative_key(object_key, width, fmt)}
+        for width in DERIVATIVE_WIDTHS
+        for fmt in FORMAT_EXTENSIONS
+    ]
+    try:
+        call_with_retry(s3_limiter, s3_client.delete_objects,
+                        Bucket=get_derivatives_bucket(bucket), Delete={'Objects': keys, 'Quiet': True})
+    except Exception as e:
+        logger.warning(f"Error deleting derivatives for {object_key}: {str(e)}")
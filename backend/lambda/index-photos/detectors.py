@@ -0,0 +1,170 @@
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import random
+import time
+import logging
+
+from image_preprocess import get_rekognition_image
+from throttling import call_with_retry, get_limiter
+
+logger = logging.getLogger()
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Label detector selection: 'rekognition' or 'local'
+LABEL_DETECTOR = os.environ.get('LABEL_DETECTOR', 'rekognition')
+
+# Local detector configuration
+LOCAL_DETECTOR_FIXTURES = os.environ.get('LOCAL_DETECTOR_FIXTURES')
+LOCAL_DETECTOR_IMAGE_DIR = os.environ.get('LOCAL_DETECTOR_IMAGE_DIR')
+LOCAL_DETECTOR_LATENCY_MS = float(os.environ.get('LOCAL_DETECTOR_LATENCY_MS', '0'))
+LOCAL_DETECTOR_JITTER_MS = float(os.environ.get('LOCAL_DETECTOR_JITTER_MS', '0'))
+
+# Reported as the model version of local detections; bump when the
+# heuristics change so the relabel job picks up affected documents
+LOCAL_MODEL_VERSION = 'local-1'
+
+# Labels the local detector picks from when no fixture or image matches
+LOCAL_VOCABULARY = [
+    'dog', 'cat', 'bird', 'person', 'tree', 'car', 'building', 'beach',
+    'mountain', 'flower', 'food', 'sky', 'water', 'city', 'animal', 'plant'
+]
+
+
+class RekognitionDetector:
+    """
+    Label detection with Amazon Rekognition DetectLabels.
+    detect() (an S3 object) and detect_bytes() (encoded image bytes, e.g.
+    a video frame) return (labels, model_version) for every detector.
+    """
+
+    name = 'rekognition'
+
+    def __init__(self, client, max_labels, min_confidence):
+        self.client = client
+        self.max_labels = max_labels
+        self.min_confidence = min_confidence
+        self.limiter = get_limiter('rekognition')
+
+    def detect(self, bucket, object_key):
+        return self.detect_image(get_rekognition_image(bucket, object_key))
+
+    def detect_bytes(self, data):
+        return self.detect_image({'Bytes': data})
+
+    def detect_image(self, image):
+        response = call_with_retry(
+            self.limiter,
+            self.client.detect_labels,
+            Image=image,
+            MaxLabels=self.max_labels,
+            MinConfidence=self.min_confidence
+        )
+        labels = [label['Name'].lower() for label in response['Labels']]
+        return labels, response.get('LabelModelVersion')
+
+
+class LocalDetector:
+    """
+    Deterministic CPU-only detector for load tests and benchmarks.
+    Labels come from, in order: a fixture file mapping key globs to labels,
+    colour/shape heuristics on a local copy of the image
+    (LOCAL_DETECTOR_IMAGE_DIR/{bucket}/{key}, needs Pillow), or a stable
+    hash of the key into LOCAL_VOCABULARY. A fixed latency plus jitter can
+    be injected to stand in for the remote call.
+    """
+
+    name = 'local'
+
+    def __init__(self, max_labels, fixtures_path=LOCAL_DETECTOR_FIXTURES,
+                 image_dir=LOCAL_DETECTOR_IMAGE_DIR, latency_ms=LOCAL_DETECTOR_LATENCY_MS,
+                 jitter_ms=LOCAL_DETECTOR_JITTER_MS):
+        self.max_labels = max_labels
+        self.image_dir = image_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fixtures = {}
+        if fixtures_path:
+            with open(fixtures_path) as f:
+                self.fixtures = json.load(f)
+
+    def detect(self, bucket, object_key):
+        self.simulate_latency()
+        return self.local_labels(bucket, object_key), LOCAL_MODEL_VERSION
+
+    def detect_bytes(self, data):
+        self.simulate_latency()
+        if Image is not None:
+            try:
+                return self.heuristic_labels(io.BytesIO(data))[:self.max_labels], LOCAL_MODEL_VERSION
+            except Exception:
+                pass
+        return self.hashed_labels(hashlib.sha256(data).hexdigest())[:self.max_labels], LOCAL_MODEL_VERSION
+
+    def simulate_latency(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000.0)
+
+    def local_labels(self, bucket, object_key):
+        for pattern, labels in self.fixtures.items():
+            if fnmatch.fnmatch(object_key, pattern):
+                return [label.lower() for label in labels][:self.max_labels]
+
+        if self.image_dir and Image is not None:
+            path = os.path.join(self.image_dir, bucket, object_key)
+            if os.path.exists(path):
+                return self.heuristic_labels(path)[:self.max_labels]
+
+        return self.hashed_labels(object_key)[:self.max_labels]
+
+    def heuristic_labels(self, path):
+        """Label an image (path or file object) from its average colour, brightness and shape."""
+        with Image.open(path) as image:
+            width, height = image.size
+            red, green, blue = image.convert('RGB').resize((1, 1)).getpixel((0, 0))
+
+        labels = []
+        if blue > red and blue > green:
+            labels.extend(['sky', 'water'])
+        elif green > red and green > blue:
+            labels.extend(['plant', 'nature'])
+        elif red > green and red > blue:
+            labels.append('sunset' if red > 180 else 'indoors')
+        brightness = (red + green + blue) / 3
+        labels.append('outdoors' if brightness > 110 else 'night')
+        if width > height * 1.5:
+            labels.append('landscape')
+        elif height > width * 1.2:
+            labels.append('portrait')
+        return labels
+
+    def hashed_labels(self, object_key):
+        """Pick a stable pseudo-random label set from the key's hash."""
+        digest = hashlib.sha256(object_key.encode('utf-8')).digest()
+        count = 1 + digest[0] % 4
+        labels = []
+        for byte in digest[1:]:
+            label = LOCAL_VOCABULARY[byte % len(LOCAL_VOCABULARY)]
+            if label not in labels:
+                labels.append(label)
+            if len(labels) == count:
+                break
+        return labels
+
+
+def create_label_detector(rekognition_client, max_labels, min_confidence, detector=LABEL_DETECTOR):
+    """
+    Create the label detector selected by LABEL_DETECTOR.
+    """
+    if detector == 'rekognition':
+        return RekognitionDetector(rekognition_client, max_labels, min_confidence)
+    if detector == 'local':
+        logger.info("Using local label detector")
+        return LocalDetector(max_labels)
+    raise ValueError(f"Unknown LABEL_DETECTOR: {detector}")
@@ -0,0 +1,237 @@
+import os
+import struct
+import logging
+
+import boto3
+from botocore.config import Config
+
+from deadline import SDK_CONNECT_TIMEOUT, SDK_READ_TIMEOUT
+from throttling import call_with_retry, get_limiter
+
+logger = logging.getLogger()
+
+s3_client = boto3.client('s3', config=Config(retries={'total_max_attempts': 1},
+                                             connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT))
+s3_limiter = get_limiter('s3')
+
+# EXIF extraction configuration
+EXIF_ENABLED = os.environ.get('EXIF_ENABLED', 'true').lower() == 'true'
+# First ranged read; further reads double the range (up to the max) only
+# when the JPEG header segments run past the bytes fetched so far
+EXIF_RANGE_BYTES = int(os.environ.get('EXIF_RANGE_BYTES', str(64 * 1024)))
+EXIF_MAX_RANGE_BYTES = int(os.environ.get('EXIF_MAX_RANGE_BYTES', str(256 * 1024)))
+
+# JPEG start-of-frame markers (carry the image dimensions)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+SOS_MARKER = 0xDA
+APP1_MARKER = 0xE1
+
+# TIFF field type -> size in bytes
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+TAG_ORIENTATION = 0x0112
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_PIXEL_X = 0xA002
+TAG_PIXEL_Y = 0xA003
+TAG_GPS_LAT_REF = 0x0001
+TAG_GPS_LAT = 0x0002
+TAG_GPS_LON_REF = 0x0003
+TAG_GPS_LON = 0x0004
+
+
+class NeedMoreData(Exception):
+    """The header extends past the bytes fetched so far."""
+
+
+def read_ifd(tiff, offset, endian):
+    """
+    Read one TIFF IFD into a dict of tag -> value.
+    Numeric single values are unwrapped; rationals become floats.
+    """
+    entries = {}
+    if offset + 2 > len(tiff):
+        return entries
+    count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, field_type, value_count = struct.unpack_from(endian + 'HHI', tiff, entry)
+        size = TIFF_TYPE_SIZES.get(field_type)
+        if size is None:
+            continue
+        total = size * value_count
+        value_offset = entry + 8 if total <= 4 else struct.unpack_from(endian + 'I', tiff, entry + 8)[0]
+        if value_offset + total > len(tiff):
+            continue
+        raw = tiff[value_offset:value_offset + total]
+
+        if field_type == 2:
+            value = raw.split(b'\0', 1)[0].decode('ascii', 'ignore').strip()
+        elif field_type in (5, 10):
+            fmt = endian + ('I' if field_type == 5 else 'i') * (2 * value_count)
+            parts = struct.unpack(fmt, raw)
+            value = [parts[j] / parts[j + 1] if parts[j + 1] else 0.0 for j in range(0, len(parts), 2)]
+        elif field_type in (3, 4, 9):
+            code = {3: 'H', 4: 'I', 9: 'i'}[field_type]
+            value = list(struct.unpack(endian + code * value_count, raw))
+        else:
+            value = raw
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        entries[tag] = value
+    return entries
+
+
+def parse_tiff(tiff):
+    """
+    Parse the TIFF structure inside an Exif APP1 segment.
+    Returns merged IFD0, Exif and GPS tags (GPS tags under 'gps').
+    """
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return {}
+    ifd0 = read_ifd(tiff, struct.unpack_from(endian + 'I', tiff, 4)[0], endian)
+    tags = dict(ifd0)
+    if isinstance(ifd0.get(TAG_EXIF_IFD), int):
+        tags.update(read_ifd(tiff, ifd0[TAG_EXIF_IFD], endian))
+    if isinstance(ifd0.get(TAG_GPS_IFD), int):
+        tags['gps'] = read_ifd(tiff, ifd0[TAG_GPS_IFD], endian)
+    return tags
+
+
+def scan_jpeg(data):
+    """
+    Walk JPEG marker segments up to the first SOF/SOS.
+    Returns (exif_tiff_bytes or None, (width, height) or None).
+    Raises NeedMoreData if the segments run past the end of data.
+    """
+    exif = None
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            raise NeedMoreData()
+        if data[pos] != 0xFF:
+            return exif, None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == SOS_MARKER:
+            return exif, None
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        if marker in SOF_MARKERS:
+            if pos + 9 > len(data):
+                raise NeedMoreData()
+            height, width = struct.unpack_from('>HH', data, pos + 5)
+            return exif, (width, height)
+        if marker == APP1_MARKER and exif is None:
+            if pos + 2 + length > len(data):
+                raise NeedMoreData()
+            segment = data[pos + 4:pos + 2 + length]
+            if segment.startswith(b'Exif\0\0'):
+                exif = segment[6:]
+        pos += 2 + length
+
+
+def gps_to_decimal(value, ref):
+    if not isinstance(value, list) or len(value) != 3:
+        return None
+    degrees = value[0] + value[1] / 60 + value[2] / 3600
+    return -degrees if ref in ('S', 'W') else degrees
+
+
+def metadata_from_tags(tags, dimensions):
+    """
+    Map raw EXIF tags to typed document fields:
+    capturedAt (ISO 8601), width, height and location (geo_point).
+    """
+    metadata = {}
+
+    captured = tags.get(TAG_DATETIME_ORIGINAL)
+    if isinstance(captured, str) and len(captured) >= 19 and not captured.startswith('0000'):
+        iso = captured[:10].replace(':', '-') + 'T' + captured[11:19]
+        offset = tags.get(TAG_OFFSET_TIME_ORIGINAL)
+        if isinstance(offset, str) and len(offset) == 6:
+            iso += offset
+        metadata['capturedAt'] = iso
+
+    if dimensions is None and isinstance(tags.get(TAG_PIXEL_X), int) and isinstance(tags.get(TAG_PIXEL_Y), int):
+        dimensions = (tags[TAG_PIXEL_X], tags[TAG_PIXEL_Y])
+    if dimensions:
+        width, height = dimensions
+        # Orientations 5-8 are rotated 90 degrees for display
+        if tags.get(TAG_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        metadata['width'] = width
+        metadata['height'] = height
+
+    gps = tags.get('gps', {})
+    lat = gps_to_decimal(gps.get(TAG_GPS_LAT), gps.get(TAG_GPS_LAT_REF))
+    lon = gps_to_decimal(gps.get(TAG_GPS_LON), gps.get(TAG_GPS_LON_REF))
+    if lat is not None and lon is not None and -90 <= lat <= 90 and -180 <= lon <= 180 and (lat, lon) != (0, 0):
+        metadata['location'] = {'lat': round(lat, 6), 'lon': round(lon, 6)}
+
+    return metadata
+
+
+def parse_image_header(data):
+    """
+    Extract metadata from the leading bytes of a JPEG or PNG.
+    Raises NeedMoreData if a JPEG header is truncated.
+    """
+    if data[:2] == b'\xff\xd8':
+        exif, dimensions = scan_jpeg(data)
+        tags = parse_tiff(exif) if exif else {}
+        return metadata_from_tags(tags, dimensions)
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack_from('>II', data, 16)
+        return {'width': width, 'height': height}
+    return {}
+
+
+def fetch_range(bucket, object_key, start, end):
+    response = call_with_retry(
+        s3_limiter,
+        s3_client.get_object,
+        Bucket=bucket,
+        Key=object_key,
+        Range=f"bytes={start}-{end}"
+    )
+    return response['Body'].read()
+
+
+def extract_metadata(bucket, object_key):
+    """
+    Read capture time, dimensions and GPS position using ranged GETs of
+    the object's leading bytes only. Returns dict of document fields
+    (empty when disabled, unsupported or on error).
+    """
+    if not EXIF_ENABLED:
+        return {}
+    try:
+        requested = EXIF_RANGE_BYTES
+        data = fetch_range(bucket, object_key, 0, requested - 1)
+        while True:
+            try:
+                metadata = parse_image_header(data)
+                break
+            except NeedMoreData:
+                # A short read means the whole object is already here
+                if len(data) < requested or requested >= EXIF_MAX_RANGE_BYTES:
+                    metadata = {}
+                    break
+                next_requested = min(requested * 2, EXIF_MAX_RANGE_BYTES)
+                data += fetch_range(bucket, object_key, len(data), next_requested - 1)
+                requested = next_requested
+        logger.info(f"EXIF metadata for {object_key}: {metadata}")
+        return metadata
+    except Exception as e:
+        logger.warning(f"Error extracting EXIF from {object_key}: {str(e)}")
+        return {}
@@ -0,0 +1,138 @@
+import io
+import os
+import threading
+import logging
+from concurrent.futures import Future
+
+import boto3
+from botocore.config import Config
+
+from deadline import SDK_CONNECT_TIMEOUT, SDK_READ_TIMEOUT
+from throttling import call_with_retry, get_limiter
+
+logger = logging.getLogger()
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+s3_client = boto3.client('s3', config=Config(retries={'total_max_attempts': 1},
+                                             connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT))
+s3_limiter = get_limiter('s3')
+
+# In-progress and completed downloads, shared by the enrichment tasks of
+# an image until release_object_bytes is called
+object_bytes_lock = threading.Lock()
+object_bytes_futures = {}
+# Objects Rekognition cannot read directly (format or size), marked by the
+# pre-check; always sent as re-encoded JPEG Bytes
+conversion_required = set()
+
+# Downscale-before-detect configuration
+DOWNSCALE_ENABLED = os.environ.get('DOWNSCALE_ENABLED', 'false').lower() == 'true'
+DOWNSCALE_MAX_DIMENSION = int(os.environ.get('DOWNSCALE_MAX_DIMENSION', '1600'))
+DOWNSCALE_JPEG_QUALITY = int(os.environ.get('DOWNSCALE_JPEG_QUALITY', '85'))
+# Rekognition rejects Image.Bytes payloads over 5 MB
+DOWNSCALE_MAX_BYTES = int(os.environ.get('DOWNSCALE_MAX_BYTES', str(5 * 1024 * 1024 - 64 * 1024)))
+# Objects smaller than this are sent as S3Object; re-encoding gains little
+DOWNSCALE_MIN_OBJECT_BYTES = int(os.environ.get('DOWNSCALE_MIN_OBJECT_BYTES', str(1024 * 1024)))
+
+
+def get_object_bytes(bucket, object_key):
+    """
+    Return an object's bytes, downloading it at most once per image.
+    Concurrent callers for the same object wait on the first caller's GET,
+    so pixel-based stages (downscale, derivatives, hashes, colours) share
+    one download. Callers must release_object_bytes when done.
+    """
+    with object_bytes_lock:
+        future = object_bytes_futures.get((bucket, object_key))
+        owner = future is None
+        if owner:
+            future = Future()
+            object_bytes_futures[(bucket, object_key)] = future
+
+    if owner:
+        try:
+            response = call_with_retry(s3_limiter, s3_client.get_object, Bucket=bucket, Key=object_key)
+            future.set_result(response['Body'].read())
+        except Exception as e:
+            future.set_exception(e)
+    return future.result()
+
+
+def release_object_bytes(bucket, object_key):
+    """
+    Drop the shared download for an object once its enrichment is done.
+    """
+    with object_bytes_lock:
+        object_bytes_futures.pop((bucket, object_key), None)
+        conversion_required.discard((bucket, object_key))
+
+
+def require_conversion(bucket, object_key):
+    """
+    Mark an object to be converted to JPEG Bytes for Rekognition,
+    regardless of DOWNSCALE_ENABLED, until release_object_bytes.
+    """
+    with object_bytes_lock:
+        conversion_required.add((bucket, object_key))
+
+
+def downscale_image_bytes(data, max_dimension=DOWNSCALE_MAX_DIMENSION,
+                          quality=DOWNSCALE_JPEG_QUALITY, max_bytes=DOWNSCALE_MAX_BYTES):
+    """
+    Decode image bytes at reduced resolution and re-encode as JPEG.
+    JPEG draft mode lets libjpeg decode directly at 1/2, 1/4 or 1/8 scale,
+    so full-resolution pixels are never materialized. Quality is lowered
+    until the output fits max_bytes. Returns JPEG bytes.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_dimension, max_dimension))
+
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        encoded = buffer.getvalue()
+        if len(encoded) <= max_bytes or quality <= 40:
+            return encoded
+        quality -= 15
+
+
+def get_rekognition_image(bucket, object_key):
+    """
+    Build the Image argument for Rekognition calls.
+    With DOWNSCALE_ENABLED (and Pillow available) large objects are
+    fetched from S3, downscaled and sent as Bytes; otherwise, or if
+    preprocessing fails, Rekognition reads the original via S3Object.
+    Objects marked by require_conversion are always sent as Bytes.
+    """
+    s3_image = {
+        'S3Object': {
+            'Bucket': bucket,
+            'Name': object_key
+        }
+    }
+    if (bucket, object_key) in conversion_required:
+        encoded = downscale_image_bytes(get_object_bytes(bucket, object_key))
+        logger.info(f"Converted {object_key} to {len(encoded)} JPEG bytes")
+        return {'Bytes': encoded}
+    if not DOWNSCALE_ENABLED or Image is None:
+        return s3_image
+
+    try:
+        data = get_object_bytes(bucket, object_key)
+        if len(data) < DOWNSCALE_MIN_OBJECT_BYTES:
+            return s3_image
+        encoded = downscale_image_bytes(data)
+        logger.info(f"Downscaled {object_key}: {len(data)} -> {len(encoded)} bytes")
+        return {'Bytes': encoded}
+    except Exception as e:
+        logger.warning(f"Downscale failed for {object_key}, using S3Object: {str(e)}")
+        return s3_image
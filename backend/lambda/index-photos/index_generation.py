@@ -0,0 +1,72 @@
+import fcntl
+import os
+import time
+import logging
+
+import boto3
+
+logger = logging.getLogger()
+
+# Index generation configuration; search-photos drops cached results
+# whenever the generation changes. Each bump also records its time, so
+# search does not cache results read before the writes became visible
+INDEX_GENERATION_BACKEND = os.environ.get('INDEX_GENERATION_BACKEND', 'none')  # none | local | dynamodb
+INDEX_GENERATION_PATH = os.environ.get('INDEX_GENERATION_PATH', '/tmp/index-generation')
+INDEX_GENERATION_TABLE = os.environ.get('INDEX_GENERATION_TABLE', 'photo-index-generation')
+INDEX_GENERATION_KEY = os.environ.get('OPENSEARCH_INDEX', 'photos')
+
+
+class LocalGenerationStore:
+    """
+    '<generation> <unix time>' in a local file, locked while it is
+    incremented. Stand-in for the DynamoDB store in local runs and tests.
+    """
+
+    def __init__(self, path=INDEX_GENERATION_PATH):
+        self.path = path
+
+    def bump(self):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            generation = int((f.read().split() or ['0'])[0]) + 1
+            f.seek(0)
+            f.truncate()
+            f.write(f"{generation} {time.time():.3f}")
+        return generation
+
+
+class DynamoDBGenerationStore:
+    """
+    Counter in a DynamoDB table keyed by 'indexName', incremented
+    atomically with an ADD update that also sets 'updatedAt'.
+    """
+
+    def __init__(self, table_name=INDEX_GENERATION_TABLE, key=INDEX_GENERATION_KEY):
+        self.table_name = table_name
+        self.key = key
+        self.client = boto3.client('dynamodb')
+
+    def bump(self):
+        response = self.client.update_item(
+            TableName=self.table_name,
+            Key={'indexName': {'S': self.key}},
+            UpdateExpression='ADD generation :one SET updatedAt = :now',
+            ExpressionAttributeValues={':one': {'N': '1'}, ':now': {'N': f"{time.time():.3f}"}},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['generation']['N'])
+
+
+def create_generation_store(backend=INDEX_GENERATION_BACKEND):
+    """
+    Create the generation store selected by INDEX_GENERATION_BACKEND.
+    Returns None when no generation is kept.
+    """
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalGenerationStore()
+    if backend == 'dynamodb':
+        return DynamoDBGenerationStore()
+    raise ValueError(f"Unknown INDEX_GENERATION_BACKEND: {backend}")
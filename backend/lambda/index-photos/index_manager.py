@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import base64
+import logging
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+
+from change_feed import create_segment_store
+from throttling import call_with_retry, get_limiter
+
+logger = logging.getLogger()
+
+opensearch_limiter = get_limiter('opensearch')
+
+# OpenSearch configuration (same variables as index-photos)
+OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT')
+OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'photos')
+OPENSEARCH_USERNAME = os.environ.get('OPENSEARCH_USERNAME', 'admin')
+OPENSEARCH_PASSWORD = os.environ.get('OPENSEARCH_PASSWORD')
+
+# Index settings applied by the template
+INDEX_SHARDS = int(os.environ.get('INDEX_SHARDS', '1'))
+INDEX_REPLICAS = int(os.environ.get('INDEX_REPLICAS', '1'))
+INDEX_REFRESH_INTERVAL = os.environ.get('INDEX_REFRESH_INTERVAL', '1s')
+# Segments left after a bulk load; fewer segments make queries cheaper
+INDEX_FORCEMERGE_SEGMENTS = int(os.environ.get('INDEX_FORCEMERGE_SEGMENTS', '1'))
+INDEX_ADMIN_TIMEOUT_SECONDS = int(os.environ.get('INDEX_ADMIN_TIMEOUT_SECONDS', '60'))
+# Force merge and reindex polling can take much longer than other calls
+INDEX_LONG_TIMEOUT_SECONDS = int(os.environ.get('INDEX_LONG_TIMEOUT_SECONDS', '3600'))
+REINDEX_POLL_SECONDS = 5
+# Documents re-copied per _reindex call when catching up from the change feed
+CATCH_UP_BATCH_SIZE = 1000
+
+# Bumped whenever the mapping below changes
+TEMPLATE_VERSION = 3
+LABEL_NORMALIZER = 'label_normalizer'
+
+# objectKey and labelSignature keep a .keyword subfield so queries written
+# against the old dynamic mapping work on both old and new indices
+PHOTO_PROPERTIES = {
+    "objectKey": {"type": "keyword", "fields": {"keyword": {"type": "keyword"}}},
+    "bucket": {"type": "keyword"},
+    "createdTimestamp": {"type": "date"},
+    # Exact, case- and accent-insensitive label terms; labels.text matches
+    # single words inside multi-word labels ("dog" in "Hot Dog")
+    "labels": {
+        "type": "keyword",
+        "normalizer": LABEL_NORMALIZER,
+        "fields": {"text": {"type": "text"}}
+    },
+    "labelModelVersion": {"type": "keyword"},
+    "labelParams": {
+        "properties": {
+            "detector": {"type": "keyword"},
+            "maxLabels": {"type": "integer"},
+            "minConfidence": {"type": "float"}
+        }
+    },
+    "labelSignature": {"type": "keyword", "fields": {"keyword": {"type": "keyword"}}},
+    "sceneText": {"type": "text"},
+    # Only read back, never searched
+    "derivatives": {"type": "object", "enabled": False},
+    "derivativesBucket": {"type": "keyword", "index": False},
+    "labelTimeline": {"type": "object", "enabled": False},
+    "palette": {"type": "keyword", "index": False},
+    "colorHistogram": {"type": "integer", "index": False},
+    "s3Sequencer": {"type": "keyword", "index": False},
+    # Tombstones of deleted objects (kept for their sequencer)
+    "deleted": {"type": "boolean"},
+    # A malformed EXIF date must not reject the whole document
+    "capturedAt": {"type": "date", "ignore_malformed": True},
+    "width": {"type": "integer"},
+    "height": {"type": "integer"},
+    "location": {"type": "geo_point", "ignore_malformed": True},
+    "phash": {"type": "keyword"},
+    "phashSegments": {"type": "keyword"},
+    "colors": {"type": "keyword"},
+    "paletteBins": {"type": "keyword"},
+    "mediaType": {"type": "keyword"},
+    "duration": {"type": "float"},
+    "frameCount": {"type": "integer"}
+}
+
+
+class IndexStateError(Exception):
+    """The cluster is not in a state the requested operation can start from."""
+
+
+def opensearch_request(method, path, body=None, timeout=INDEX_ADMIN_TIMEOUT_SECONDS):
+    """
+    Send an admin request to OpenSearch, retrying throttles and transient
+    errors. Returns the parsed JSON response; HTTP errors are raised.
+    """
+    auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode('utf-8')).decode('utf-8')
+    req = urllib.request.Request(
+        f"https://{OPENSEARCH_ENDPOINT}{path}",
+        data=json.dumps(body).encode('utf-8') if body is not None else None,
+        headers={"Content-Type": "application/json", "Authorization": f"Basic {auth}"},
+        method=method
+    )
+
+    def send():
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response_body = response.read().decode('utf-8')
+            return json.loads(response_body) if response_body else {}
+
+    return call_with_retry(opensearch_limiter, send)
+
+
+def build_template(alias=OPENSEARCH_INDEX):
+    """
+    Composable index template for the alias and its versioned indices
+    ({alias}-v1, {alias}-v2, ...).
+    """
+    return {
+        "index_patterns": [alias, f"{alias}-*"],
+        "priority": 100,
+        "version": TEMPLATE_VERSION,
+        "template": {
+            "settings": {
+                "number_of_shards": INDEX_SHARDS,
+                "number_of_replicas": INDEX_REPLICAS,
+                "refresh_interval": INDEX_REFRESH_INTERVAL,
+                "analysis": {
+                    "normalizer": {
+                        LABEL_NORMALIZER: {"type": "custom", "filter": ["lowercase", "asciifolding"]}
+                    }
+                }
+            },
+            "mappings": {"properties": PHOTO_PROPERTIES}
+        }
+    }
+
+
+def install_template(alias=OPENSEARCH_INDEX):
+    """
+    Install (or replace) the index template. Only indices created
+    afterwards use it; existing ones need a migration.
+    """
+    opensearch_request('PUT', f"/_index_template/{alias}", build_template(alias))
+    logger.info(f"Installed index template {alias} (version {TEMPLATE_VERSION})")
+
+
+def index_exists(name):
+    try:
+        opensearch_request('HEAD', f"/{name}")
+        return True
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return False
+        raise
+
+
+def get_alias_indices(alias):
+    """Indices behind an alias (empty if there is no such alias)."""
+    try:
+        return sorted(opensearch_request('GET', f"/_alias/{alias}"))
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return []
+        raise
+
+
+def begin_bulk_load(index):
+    """
+    Switch an index (or every index behind an alias) to bulk-load
+    settings: no periodic refresh and no replicas. The previous values
+    are saved in the mapping's _meta so end_bulk_load can restore them
+    from any process; calling this again while loading is a no-op.
+    """
+    settings = opensearch_request('GET', f"/{index}/_settings?flat_settings=true")
+    mappings = opensearch_request('GET', f"/{index}/_mapping")
+    for name, state in settings.items():
+        if mappings.get(name, {}).get('mappings', {}).get('_meta', {}).get('bulkLoad'):
+            logger.info(f"{name} is already in bulk-load mode")
+            continue
+        saved = {
+            'refresh_interval': state['settings'].get('index.refresh_interval'),
+            'number_of_replicas': state['settings'].get('index.number_of_replicas')
+        }
+        opensearch_request('PUT', f"/{name}/_mapping", {"_meta": {"bulkLoad": saved}})
+        opensearch_request('PUT', f"/{name}/_settings",
+                           {"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+        logger.info(f"{name} in bulk-load mode (saved settings {saved})")
+
+
+def end_bulk_load(index, force_merge=True):
+    """
+    Restore the settings saved by begin_bulk_load, refresh, and
+    force-merge down to INDEX_FORCEMERGE_SEGMENTS segments.
+    """
+    mappings = opensearch_request('GET', f"/{index}/_mapping")
+    for name, state in mappings.items():
+        saved = state.get('mappings', {}).get('_meta', {}).get('bulkLoad')
+        if not saved:
+            logger.info(f"{name} is not in bulk-load mode")
+            continue
+        # A saved None resets the setting to the cluster default
+        opensearch_request('PUT', f"/{name}/_settings", {"index": saved})
+        opensearch_request('PUT', f"/{name}/_mapping", {"_meta": {"bulkLoad": None}})
+        opensearch_request('POST', f"/{name}/_refresh")
+        if force_merge:
+            started = time.time()
+            opensearch_request('POST', f"/{name}/_forcemerge?max_num_segments={INDEX_FORCEMERGE_SEGMENTS}",
+                               timeout=INDEX_LONG_TIMEOUT_SECONDS)
+            logger.info(f"Force-merged {name} in {time.time() - started:.1f}s")
+        logger.info(f"{name} restored to {saved}")
+
+
+@contextmanager
+def bulk_load(index, force_merge=True):
+    """Bulk-load mode for the enclosed import; settings are restored even if it fails."""
+    begin_bulk_load(index)
+    try:
+        yield
+    finally:
+        end_bulk_load(index, force_merge)
+
+
+def reindex(source, dest, query=None):
+    """
+    Copy documents from source to dest with _reindex, run as a task and
+    polled until done. Returns the task's status counters.
+    """
+    body = {"source": {"index": source}, "dest": {"index": dest}, "conflicts": "proceed"}
+    if query:
+        body['source']['query'] = query
+    task = opensearch_request('POST', "/_reindex?wait_for_completion=false", body)['task']
+    while True:
+        result = opensearch_request('GET', f"/_tasks/{task}")
+        if result.get('completed'):
+            break
+        status = result['task']['status']
+        logger.info(f"Reindex {source} -> {dest}: {status['created'] + status['updated']}/{status['total']}")
+        time.sleep(REINDEX_POLL_SECONDS)
+    response = result.get('response', {})
+    if response.get('failures') or result.get('error'):
+        raise Exception(f"Reindex {source} -> {dest} failed: {response.get('failures') or result.get('error')}")
+    return {key: response.get(key) for key in ('total', 'created', 'updated', 'version_conflicts')}
+
+
+def changed_document_ids(store, since):
+    """
+    Ids of the documents the change feed recorded as written after since
+    (epoch seconds), without duplicates. Segments are named by flush
+    time, which is never earlier than the writes they hold.
+    """
+    ids = {}
+    for name in store.list(after=f"{int(since * 1000):013d}"):
+        for line in store.get(name).decode('utf-8').splitlines():
+            ids[json.loads(line)['id']] = True
+    return list(ids)
+
+
+def catch_up_from_feed(store, source, dest, since):
+    """
+    Bring dest up to date with every document changed in source after
+    since: each changed id is removed from dest and copied again, so
+    partial updates, tombstones and plain deletes all carry over.
+    Returns the number of ids caught up.
+    """
+    ids = changed_document_ids(store, since)
+    for start in range(0, len(ids), CATCH_UP_BATCH_SIZE):
+        query = {"ids": {"values": ids[start:start + CATCH_UP_BATCH_SIZE]}}
+        opensearch_request('POST', f"/{dest}/_delete_by_query?refresh=true&conflicts=proceed",
+                           {"query": query}, timeout=INDEX_LONG_TIMEOUT_SECONDS)
+        reindex(source, dest, query)
+    return len(ids)
+
+
+def migrate(version, alias=OPENSEARCH_INDEX, replace_index=False, copy=True):
+    """
+    Move the alias to a new index {alias}-v{version} built from the
+    current template:
+    1. install the template and create the new index,
+    2. copy the current documents in bulk-load mode,
+    3. copy documents written meanwhile: every id the change feed
+       recorded since the copy started, or (with CHANGE_FEED_BACKEND
+       none) documents by createdTimestamp,
+    4. atomically point the alias at the new index.
+    The old index is kept unless it was a concrete index named like the
+    alias (the original implicitly created index), which must be removed
+    in the same step for the alias to take its name (replace_index).
+    Without the change feed, deletes and partial updates (relabels) made
+    during the copy are lost; either way, writes landing between the
+    catch-up and the alias switch are, so pause ingest for a gap-free
+    switch. Returns the new index name.
+    """
+    target = f"{alias}-v{version}"
+    if index_exists(target):
+        raise IndexStateError(f"{target} already exists")
+    sources = get_alias_indices(alias)
+    concrete = not sources and index_exists(alias)
+    if concrete and not replace_index:
+        raise IndexStateError(f"{alias} is an index, not an alias; it must be replaced (and deleted) to migrate")
+
+    install_template(alias)
+    opensearch_request('PUT', f"/{target}", {})
+    logger.info(f"Created {target}")
+
+    if copy and (sources or concrete):
+        started = time.time()
+        with bulk_load(target):
+            logger.info(f"Copied {reindex(alias, target)}")
+        store = create_segment_store()
+        if store is not None:
+            logger.info(f"Caught up {catch_up_from_feed(store, alias, target, started)} changed documents")
+        else:
+            since = datetime.utcfromtimestamp(started).isoformat()
+            caught_up = reindex(alias, target, {"range": {"createdTimestamp": {"gte": since}}})
+            logger.info(f"Caught up {caught_up}")
+
+    actions = [{"add": {"index": target, "alias": alias, "is_write_index": True}}]
+    actions += [{"remove": {"index": index, "alias": alias}} for index in sources]
+    if concrete:
+        actions.append({"remove_index": {"index": alias}})
+    opensearch_request('POST', "/_aliases", {"actions": actions})
+    logger.info(f"Alias {alias} now points at {target}")
+    return target
@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+import boto3
+
+logger = logging.getLogger()
+
+# Label cache configuration
+LABEL_CACHE_BACKEND = os.environ.get('LABEL_CACHE_BACKEND', 'memory')  # none | memory | sqlite | dynamodb
+LABEL_CACHE_MAX_ENTRIES = int(os.environ.get('LABEL_CACHE_MAX_ENTRIES', '2048'))
+LABEL_CACHE_TTL_SECONDS = int(os.environ.get('LABEL_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LABEL_CACHE_PATH = os.environ.get('LABEL_CACHE_PATH', '/tmp/label-cache.sqlite3')
+LABEL_CACHE_TABLE = os.environ.get('LABEL_CACHE_TABLE', 'photo-label-cache')
+
+
+def make_cache_key(digest, max_labels, min_confidence):
+    """
+    Build the cache key for an image digest and detection parameters.
+    """
+    return f"{digest}:{max_labels}:{min_confidence}"
+
+
+class MemoryLabelCache:
+    """
+    Thread-safe in-process LRU cache; survives warm Lambda invocations.
+    """
+
+    def __init__(self, max_entries=LABEL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, labels):
+        with self.lock:
+            self.entries[key] = labels
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class SQLiteLabelCache:
+    """
+    Persistent key-value cache in a local SQLite file.
+    Stand-in for the DynamoDB backend in local runs and tests.
+    """
+
+    def __init__(self, path=LABEL_CACHE_PATH, ttl_seconds=LABEL_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS label_cache "
+            "(cache_key TEXT PRIMARY KEY, labels TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT labels, expires_at FROM label_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if not row or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, labels):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO label_cache (cache_key, labels, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(labels), int(time.time()) + self.ttl_seconds)
+            )
+            self.conn.commit()
+
+
+class DynamoDBLabelCache:
+    """
+    Persistent cache in a DynamoDB table keyed by 'cacheKey'.
+    Expiry relies on DynamoDB TTL on the 'expiresAt' attribute.
+    """
+
+    def __init__(self, table_name=LABEL_CACHE_TABLE, ttl_seconds=LABEL_CACHE_TTL_SECONDS):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.client = boto3.client('dynamodb')
+
+    def get(self, key):
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={'cacheKey': {'S': key}}
+        )
+        item = response.get('Item')
+        # TTL deletion is lazy, so check expiry ourselves
+        if not item or int(item['expiresAt']['N']) < time.time():
+            return None
+        return json.loads(item['labels']['S'])
+
+    def put(self, key, labels):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                'cacheKey': {'S': key},
+                'labels': {'S': json.dumps(labels)},
+                'expiresAt': {'N': str(int(time.time()) + self.ttl_seconds)}
+            }
+        )
+
+
+class TieredLabelCache:
+    """
+    In-memory LRU in front of a persistent backend.
+    Persistent hits are promoted to memory; backend errors are logged
+    and treated as misses so caching never fails indexing.
+    """
+
+    def __init__(self, memory, persistent):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, key):
+        labels = self.memory.get(key)
+        if labels is not None:
+            return labels
+        try:
+            labels = self.persistent.get(key)
+        except Exception as e:
+            logger.warning(f"Label cache read failed: {str(e)}")
+            return None
+        if labels is not None:
+            self.memory.put(key, labels)
+        return labels
+
+    def put(self, key, labels):
+        self.memory.put(key, labels)
+        try:
+            self.persistent.put(key, labels)
+        except Exception as e:
+            logger.warning(f"Label cache write failed: {str(e)}")
+
+
+def create_label_cache(backend=LABEL_CACHE_BACKEND):
+    """
+    Create the label cache selected by LABEL_CACHE_BACKEND.
+    Returns None when caching is disabled.
+    """
+    if backend == 'none':
+        return None
+    memory = MemoryLabelCache()
+    if backend == 'memory':
+        return memory
+    if backend == 'sqlite':
+        return TieredLabelCache(memory, SQLiteLabelCache())
+    if backend == 'dynamodb':
+        return TieredLabelCache(memory, DynamoDBLabelCache())
+    raise ValueError(f"Unknown LABEL_CACHE_BACKEND: {backend}")
@@ -3,14 +3,49 @@ import boto3
 import os
 import urllib.request
 import base64
+import hashlib
+import urllib.error
+import urllib.parse
 from datetime import datetime
 import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError, wait
+from functools import partial
+
+from botocore.config import Config
+
+from change_feed import create_change_feed, is_change_feed_key, make_change_record
+from colors import COLORS_ENABLED, extract_colors
+from deadline import (SDK_CONNECT_TIMEOUT, SDK_READ_TIMEOUT, Deadline, DeadlineExceeded,
+                      deadline_scope, get_current_deadline)
+from derivatives import (DERIVATIVES_ENABLED, delete_derivatives, generate_derivatives, get_derivatives_bucket,
+                         is_derivative_key)
+from detectors import create_label_detector
+from exif import EXIF_ENABLED, extract_metadata
+from image_preprocess import release_object_bytes
+from index_generation import create_generation_store
+from label_cache import create_label_cache, make_cache_key
+from phash import PHASH_ENABLED, compute_phash_fields
+from preflight import PREFLIGHT_ENABLED, ObjectSkipped, check_object, log_skip
+from scheduler import (LANES, SCHEDULER_LANE_METADATA, LaneExecutor, classify_lane, get_current_lane,
+                       get_metadata_lane, lane_scope)
+from throttling import backoff_delay, call_with_retry, get_limiter, get_limiter_stats
+from video import VIDEO_ENABLED, detect_video_labels, is_video_key
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3_client = boto3.client('s3')
-rekognition_client = boto3.client('rekognition')
+# Retries are handled by call_with_retry, so disable the SDK's own retries
+# to keep attempts (and backoff) from multiplying
+sdk_config = Config(retries={'total_max_attempts': 1}, connect_timeout=SDK_CONNECT_TIMEOUT,
+                    read_timeout=SDK_READ_TIMEOUT)
+s3_client = boto3.client('s3', config=sdk_config)
+rekognition_client = boto3.client('rekognition', config=sdk_config)
+
+rekognition_limiter = get_limiter('rekognition')
+s3_limiter = get_limiter('s3')
+opensearch_limiter = get_limiter('opensearch')
 
 # OpenSearch configuration
 OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT')
@@ -20,94 +55,926 @@ OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'photos')
 OPENSEARCH_USERNAME = os.environ.get('OPENSEARCH_USERNAME', 'admin')
 OPENSEARCH_PASSWORD = os.environ.get('OPENSEARCH_PASSWORD')
 
+# Bulk indexing configuration
+OPENSEARCH_BULK_ENABLED = os.environ.get('OPENSEARCH_BULK_ENABLED', 'true').lower() == 'true'
+OPENSEARCH_BULK_MAX_DOCS = int(os.environ.get('OPENSEARCH_BULK_MAX_DOCS', '500'))
+OPENSEARCH_BULK_MAX_BYTES = int(os.environ.get('OPENSEARCH_BULK_MAX_BYTES', str(5 * 1024 * 1024)))
+OPENSEARCH_BULK_MAX_RETRIES = int(os.environ.get('OPENSEARCH_BULK_MAX_RETRIES', '2'))
+# Socket timeout per OpenSearch call (capped by the time left in the invocation)
+OPENSEARCH_TIMEOUT_SECONDS = float(os.environ.get('OPENSEARCH_TIMEOUT_SECONDS', '30'))
 
-def lambda_handler(event, context):
+# Deadline budgets, measured against the Lambda's remaining time: a record
+# still running after INGEST_RECORD_TIMEOUT_SECONDS, or not started with
+# less than INGEST_RECORD_MIN_SECONDS left, is handed back for retry;
+# INGEST_WRITE_RESERVE_SECONDS are kept for the final bulk writes
+INGEST_RECORD_TIMEOUT_SECONDS = float(os.environ.get('INGEST_RECORD_TIMEOUT_SECONDS', '20'))
+INGEST_RECORD_MIN_SECONDS = float(os.environ.get('INGEST_RECORD_MIN_SECONDS', '3'))
+INGEST_WRITE_RESERVE_SECONDS = float(os.environ.get('INGEST_WRITE_RESERVE_SECONDS', '3'))
+
+# Number of records processed concurrently (1 = sequential); records are
+# taken from the interactive and bulk lanes by weighted fair sharing
+INDEX_MAX_WORKERS = int(os.environ.get('INDEX_MAX_WORKERS', '8'))
+
+# Rekognition DetectLabels parameters (also part of the label cache key)
+REKOGNITION_MAX_LABELS = int(os.environ.get('REKOGNITION_MAX_LABELS', '10'))
+REKOGNITION_MIN_CONFIDENCE = float(os.environ.get('REKOGNITION_MIN_CONFIDENCE', '50'))
+
+# Content digest used for the label cache: 'etag' or 'sha256'
+LABEL_CACHE_DIGEST = os.environ.get('LABEL_CACHE_DIGEST', 'etag')
+
+# Per-image enrichment configuration
+ENRICHMENT_MAX_WORKERS = int(os.environ.get('ENRICHMENT_MAX_WORKERS', str(max(INDEX_MAX_WORKERS, 1) * 3)))
+DETECT_TEXT_ENABLED = os.environ.get('DETECT_TEXT_ENABLED', 'false').lower() == 'true'
+DETECT_TEXT_MIN_CONFIDENCE = float(os.environ.get('DETECT_TEXT_MIN_CONFIDENCE', '80'))
+
+# Lane-aware pools shared across warm invocations. Per-image calls get
+# their own pool so record workers never wait on their own executor
+record_executor = LaneExecutor('records', INDEX_MAX_WORKERS)
+enrichment_executor = LaneExecutor('enrichment', ENRICHMENT_MAX_WORKERS)
+
+# Created once per container so the in-memory tier survives warm invocations
+label_cache = create_label_cache()
+
+# Buffered per container; flushed as a segment after each batch of writes
+change_feed = create_change_feed()
+
+# Bumped after writes so search-photos drops cached results
+generation_store = create_generation_store()
+changes_pending = threading.Event()
+
+label_detector = create_label_detector(rekognition_client, REKOGNITION_MAX_LABELS, REKOGNITION_MIN_CONFIDENCE)
+
+# Apply an event only if it is newer than the stored one (S3 sequencers are
+# zero-padded by normalize_sequencer so string order matches event order).
+# Deletes store a tombstone through the same script, so the sequencer
+# survives and an older create arriving later is still ignored
+UPSERT_SCRIPT = (
+    "if (ctx._source.s3Sequencer == null || ctx._source.s3Sequencer.compareTo(params.doc.s3Sequencer) < 0) "
+    "{ ctx._source.clear(); ctx._source.putAll(params.doc) } else { ctx.op = 'none' }"
+)
+SEQUENCER_WIDTH = 32
+# Sorts below the zero-padded hex of every event sequencer
+BACKFILL_SEQUENCER_PREFIX = '-'
+
+# Bulk item statuses worth resubmitting (throttling / transient unavailability)
+RETRYABLE_BULK_STATUSES = {429, 502, 503, 504}
+
+
+def get_content_digest(bucket, object_key, etag=None):
     """
-    Lambda function triggered by S3 PUT events.
-    Detects labels in images using Rekognition and indexes them in OpenSearch.
+    Return a digest identifying the object's content for the label cache.
+    Uses the S3 SHA-256 checksum when LABEL_CACHE_DIGEST is 'sha256' and the
+    object has one, otherwise the ETag (taken from the event when present).
+    """
+    if LABEL_CACHE_DIGEST == 'sha256':
+        response = call_with_retry(s3_limiter, s3_client.head_object,
+                                   Bucket=bucket, Key=object_key, ChecksumMode='ENABLED')
+        checksum = response.get('ChecksumSHA256')
+        if checksum:
+            return f"sha256:{checksum}"
+        etag = response.get('ETag')
+    elif not etag:
+        etag = call_with_retry(s3_limiter, s3_client.head_object, Bucket=bucket, Key=object_key).get('ETag')
+    if not etag:
+        return None
+    return 'etag:' + etag.strip('"')
+
+
+def get_label_params(model_version):
+    """
+    Detection provenance stored on each document. labelSignature combines
+    detector, model version and parameters into one keyword, so documents
+    labelled under anything else can be found with a single term query.
+    """
+    return {
+        "labelModelVersion": model_version,
+        "labelParams": {
+            "detector": label_detector.name,
+            "maxLabels": REKOGNITION_MAX_LABELS,
+            "minConfidence": REKOGNITION_MIN_CONFIDENCE
+        },
+        "labelSignature": (f"{label_detector.name}:{model_version}:"
+                           f"{REKOGNITION_MAX_LABELS}:{REKOGNITION_MIN_CONFIDENCE}")
+    }
+
+
+def detect_image_labels(bucket, object_key, etag=None, use_cache=True):
+    """
+    Detect labels for an image, consulting the label cache first.
+    Duplicate content (same digest, detector and detection parameters)
+    skips the detector entirely; use_cache=False always calls the detector
+    (the result still refreshes the cache).
+    Returns (list of lowercase label names, model version).
+    """
+    cache_key = None
+    if label_cache is not None:
+        try:
+            digest = get_content_digest(bucket, object_key, etag)
+            if digest:
+                cache_key = make_cache_key(f"{label_detector.name}:{digest}",
+                                           REKOGNITION_MAX_LABELS, REKOGNITION_MIN_CONFIDENCE)
+        except Exception as e:
+            logger.warning(f"Error computing content digest: {str(e)}")
+    
+    if cache_key and use_cache:
+        cached = label_cache.get(cache_key)
+        # Entries written before model versions were recorded are plain lists
+        if isinstance(cached, dict):
+            logger.info(f"Label cache hit for {object_key}: {cached['labels']}")
+            return cached['labels'], cached.get('modelVersion')
+    
+    detected_labels, model_version = label_detector.detect(bucket, object_key)
+    logger.info(f"Detected labels ({label_detector.name} {model_version}): {detected_labels}")
+    
+    if cache_key:
+        label_cache.put(cache_key, {'labels': detected_labels, 'modelVersion': model_version})
+    return detected_labels, model_version
+
+
+def get_object_metadata(bucket, object_key):
+    """
+    Return the object's user metadata, or None if it cannot be read.
     """
     try:
-        logger.info(f"Event: {json.dumps(event)}")
+        return call_with_retry(s3_limiter, s3_client.head_object,
+                               Bucket=bucket, Key=object_key).get('Metadata', {})
+    except Exception as e:
+        logger.warning(f"Error retrieving metadata: {str(e)}")
+        return None
+
+
+def get_custom_labels(bucket, object_key, metadata=None):
+    """
+    Read custom labels from the x-amz-meta-customlabels object metadata.
+    metadata is the object's user metadata when the caller already has it
+    (from the preflight HEAD); otherwise it is read with head_object.
+    Returns list of lowercase labels (empty if none or on error).
+    """
+    if metadata is None:
+        metadata = get_object_metadata(bucket, object_key) or {}
+    custom_labels_str = metadata.get('customlabels', '')
+    
+    # Parse custom labels (comma-separated)
+    custom_labels = []
+    if custom_labels_str:
+        custom_labels = [label.strip().lower() for label in custom_labels_str.split(',') if label.strip()]
+        logger.info(f"Custom labels: {custom_labels}")
+    return custom_labels
+
+
+def detect_scene_text(bucket, object_key):
+    """
+    Detect words in an S3 image using Rekognition DetectText.
+    Returns list of unique lowercase words (empty on error).
+    """
+    try:
+        response = call_with_retry(
+            rekognition_limiter,
+            rekognition_client.detect_text,
+            Image={
+                'S3Object': {
+                    'Bucket': bucket,
+                    'Name': object_key
+                }
+            }
+        )
+        words = []
+        for detection in response.get('TextDetections', []):
+            if detection.get('Type') != 'WORD' or detection.get('Confidence', 0) < DETECT_TEXT_MIN_CONFIDENCE:
+                continue
+            word = ''.join(ch for ch in detection.get('DetectedText', '').lower() if ch.isalnum())
+            if len(word) > 2 and word not in words:
+                words.append(word)
+        logger.info(f"Scene text: {words}")
+        return words
+    except Exception as e:
+        logger.warning(f"Error detecting text: {str(e)}")
+        return []
+
+
+def get_enrichment_tasks(etag=None, metadata=None):
+    """
+    Return the independent per-image calls to run, keyed by result name.
+    Each task takes (bucket, object_key).
+    """
+    tasks = {
+        'labels': partial(detect_image_labels, etag=etag),
+        'customLabels': partial(get_custom_labels, metadata=metadata)
+    }
+    if DETECT_TEXT_ENABLED:
+        tasks['sceneText'] = detect_scene_text
+    if DERIVATIVES_ENABLED:
+        tasks['derivatives'] = generate_derivatives
+    if EXIF_ENABLED:
+        tasks['exif'] = extract_metadata
+    if PHASH_ENABLED:
+        tasks['phash'] = compute_phash_fields
+    if COLORS_ENABLED:
+        tasks['colors'] = extract_colors
+    return tasks
+
+
+def enrich_image(bucket, object_key, etag=None, metadata=None):
+    """
+    Run all enrichment tasks for one image concurrently.
+    Latency is bounded by the slowest call rather than the sum.
+    Returns dict of task name to result; re-raises the first task error.
+    """
+    futures = {
+        name: enrichment_executor.submit(get_current_lane(), task, bucket, object_key)
+        for name, task in get_enrichment_tasks(etag, metadata).items()
+    }
+    try:
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        # Let every task finish before dropping the shared download
+        wait(futures.values())
+        release_object_bytes(bucket, object_key)
+
+
+def build_document(bucket, object_key, etag=None, metadata=None):
+    """
+    Run enrichment for one image and build its OpenSearch document.
+    metadata is the object's user metadata if already read (preflight).
+    """
+    logger.info(f"Processing: {object_key} from {bucket}")
+    
+    enrichment = enrich_image(bucket, object_key, etag, metadata)
+    
+    # Combine all labels
+    detected_labels, model_version = enrichment['labels']
+    all_labels = list(set(detected_labels + enrichment['customLabels']))
+    logger.info(f"All labels: {all_labels}")
+    
+    # Create document for OpenSearch
+    document = {
+        "objectKey": object_key,
+        "bucket": bucket,
+        "createdTimestamp": datetime.utcnow().isoformat(),
+        "labels": all_labels
+    }
+    document.update(get_label_params(model_version))
+    if 'sceneText' in enrichment:
+        document['sceneText'] = enrichment['sceneText']
+    if enrichment.get('derivatives'):
+        document['derivatives'] = enrichment['derivatives']
+        document['derivativesBucket'] = get_derivatives_bucket(bucket)
+    # capturedAt, width, height and location from EXIF
+    document.update(enrichment.get('exif', {}))
+    # phash and phashSegments for similar-photo search
+    document.update(enrichment.get('phash', {}))
+    # colors, palette, paletteBins and colorHistogram for colour search
+    document.update(enrichment.get('colors', {}))
+    return document
+
+
+def build_video_document(bucket, object_key, metadata=None):
+    """
+    Build the document for a video clip: labels aggregated over sampled
+    scene keyframes (detected in parallel on the enrichment pool), with
+    a per-label first-seen timeline. Image-only stages are not run.
+    metadata is the object's user metadata if already read (preflight).
+    """
+    logger.info(f"Processing video: {object_key} from {bucket}")
+    lane = get_current_lane()
+    
+    def submit(fn, *args):
+        return enrichment_executor.submit(lane, fn, *args)
+    
+    video = detect_video_labels(bucket, object_key, label_detector, submit)
+    document = {
+        "objectKey": object_key,
+        "bucket": bucket,
+        "createdTimestamp": datetime.utcnow().isoformat(),
+        "mediaType": "video",
+        "labels": list(set(video['labels'] + get_custom_labels(bucket, object_key, metadata))),
+        "labelTimeline": video['labelTimeline'],
+        "duration": video['duration'],
+        "frameCount": video['frameCount']
+    }
+    document.update(get_label_params(video['modelVersion']))
+    return document
+
+
+def build_label_update(bucket, object_key, seq_no=None, primary_term=None):
+    """
+    Re-detect labels for an indexed image and return a partial-update
+    document for bulk_index_documents. Only labels and label provenance
+    are rewritten; with seq_no/primary_term the update is applied only if
+    the document is unchanged since it was read. Raises ObjectSkipped if
+    the object no longer passes the pre-check or is now a video.
+    """
+    metadata = None
+    try:
+        if PREFLIGHT_ENABLED:
+            # The object may have been replaced since it was indexed
+            details = check_object(bucket, object_key)
+            if details.get('mediaType') == 'video':
+                # Video labels come from keyframes; re-ingest the clip instead
+                raise ObjectSkipped('video')
+            metadata = details['metadata']
+        detected_labels, model_version = detect_image_labels(bucket, object_key, use_cache=False)
+    finally:
+        release_object_bytes(bucket, object_key)
+    fields = {"labels": list(set(detected_labels + get_custom_labels(bucket, object_key, metadata)))}
+    fields.update(get_label_params(model_version))
+    update = {"bucket": bucket, "objectKey": object_key, "partialUpdate": fields}
+    if seq_no is not None:
+        update['ifSeqNo'] = seq_no
+        update['ifPrimaryTerm'] = primary_term
+    return update
+
+
+def get_opensearch_headers(content_type='application/json'):
+    """
+    Build HTTP headers with basic auth for OpenSearch requests.
+    """
+    auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode('utf-8')).decode('utf-8')
+    return {
+        "Content-Type": content_type,
+        "Authorization": f"Basic {auth}"
+    }
+
+
+def make_document_id(bucket, object_key):
+    """
+    Deterministic document ID for an object, so redelivered events and
+    reindexing overwrite the same document instead of adding duplicates.
+    """
+    return hashlib.sha256(f"{bucket}/{object_key}".encode('utf-8')).hexdigest()
+
+
+def normalize_sequencer(sequencer):
+    """
+    Left-pad an S3 event sequencer so that string comparison orders
+    events for the same key (per the S3 event notification docs).
+    """
+    if not sequencer:
+        return None
+    return sequencer.upper().rjust(SEQUENCER_WIDTH, '0')
+
+
+def make_backfill_sequencer(last_modified):
+    """
+    Sequencer for a write built from a bucket listing instead of an event.
+    It is older than any event sequencer, so a backfill never overwrites a
+    document or tombstone written by an event; backfills of the same key
+    are ordered by the object's LastModified.
+    """
+    return BACKFILL_SEQUENCER_PREFIX + last_modified.strftime('%Y%m%dT%H%M%S')
+
+
+def make_tombstone(bucket, object_key, sequencer=None):
+    """
+    Build the record that stands in for a document when its object is deleted.
+    With a sequencer it is stored as a tombstone document ('deleted':
+    true), which search excludes.
+    """
+    return {
+        "objectKey": object_key,
+        "bucket": bucket,
+        "s3Sequencer": sequencer,
+        "deleted": True
+    }
+
+
+def build_write_request(document):
+    """
+    Build the bulk action and body for a document or tombstone.
+    Documents carrying an S3 sequencer become scripted upserts that are
+    skipped when a newer event already wrote the document. Tombstones
+    with a sequencer replace the document the same way (keeping the
+    sequencer for later events), without one they are plain deletes.
+    Partial updates (see build_label_update) merge fields, optionally
+    guarded by sequence number.
+    Returns (action, body), body is None for plain deletes.
+    """
+    doc_id = make_document_id(document['bucket'], document['objectKey'])
+    sequencer = document.get('s3Sequencer')
+    
+    if 'partialUpdate' in document:
+        meta = {"_index": OPENSEARCH_INDEX, "_id": doc_id}
+        if document.get('ifSeqNo') is not None:
+            meta['if_seq_no'] = document['ifSeqNo']
+            meta['if_primary_term'] = document['ifPrimaryTerm']
+        return {"update": meta}, {"doc": document['partialUpdate']}
+    
+    if document.get('deleted') and not sequencer:
+        return {"delete": {"_index": OPENSEARCH_INDEX, "_id": doc_id}}, None
+    
+    if not sequencer:
+        return {"index": {"_index": OPENSEARCH_INDEX, "_id": doc_id}}, document
+    return (
+        {"update": {"_index": OPENSEARCH_INDEX, "_id": doc_id, "retry_on_conflict": 3}},
+        {
+            "scripted_upsert": True,
+            "script": {"source": UPSERT_SCRIPT, "lang": "painless", "params": {"doc": document}},
+            "upsert": {}
+        }
+    )
+
+
+def send_opensearch_request(path, data, content_type='application/json', method='POST'):
+    """
+    Send a request to OpenSearch under the opensearch limiter, retrying
+    throttles (429) and transient errors. Each attempt times out after
+    OPENSEARCH_TIMEOUT_SECONDS or at the current deadline.
+    Returns (status, response_body).
+    """
+    req = urllib.request.Request(
+        f"https://{OPENSEARCH_ENDPOINT}{path}",
+        data=data,
+        headers=get_opensearch_headers(content_type),
+        method=method
+    )
+    
+    def send():
+        timeout = get_current_deadline().timeout(OPENSEARCH_TIMEOUT_SECONDS)
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, response.read().decode('utf-8')
+    
+    return call_with_retry(opensearch_limiter, send)
+
+
+def index_document(document):
+    """
+    Write a single document (or tombstone) to OpenSearch without _bulk.
+    """
+    action, body = build_write_request(document)
+    action_type, meta = next(iter(action.items()))
+    path = {
+        'index': f"/{OPENSEARCH_INDEX}/_doc/{meta['_id']}",
+        'update': f"/{OPENSEARCH_INDEX}/_update/{meta['_id']}?retry_on_conflict=3",
+        'delete': f"/{OPENSEARCH_INDEX}/_doc/{meta['_id']}"
+    }[action_type]
+    method = {'index': 'PUT', 'update': 'POST', 'delete': 'DELETE'}[action_type]
+    
+    try:
+        status, response_body = send_opensearch_request(
+            path,
+            json.dumps(body).encode('utf-8') if body is not None else None,
+            method=method
+        )
+    except urllib.error.HTTPError as e:
+        # Deleting a document that was never indexed is not an error
+        if e.code == 404 and document.get('deleted'):
+            logger.info(f"Nothing to delete for: {document['objectKey']}")
+            return
+        raise
+    if status in [200, 201]:
+        logger.info(f"Successfully wrote: {document['objectKey']}")
+        if json.loads(response_body).get('result') != 'noop':
+            record_changes([document])
+            delete_applied_derivatives([document])
+    else:
+        logger.error(f"Failed to index. Status: {status}, Response: {response_body}")
+        raise Exception(f"OpenSearch indexing failed: {response_body}")
+
+
+def chunk_bulk_actions(documents):
+    """
+    Split documents into NDJSON _bulk payloads.
+    Each chunk holds at most OPENSEARCH_BULK_MAX_DOCS documents and
+    OPENSEARCH_BULK_MAX_BYTES bytes (a single oversized document still
+    gets its own chunk). Yields (documents, payload) tuples.
+    """
+    chunk_docs = []
+    chunk_lines = []
+    chunk_bytes = 0
+    
+    for document in documents:
+        action, body = build_write_request(document)
+        entry = json.dumps(action) + "\n"
+        if body is not None:
+            entry += json.dumps(body) + "\n"
+        entry_bytes = len(entry.encode('utf-8'))
+        
+        if chunk_docs and (len(chunk_docs) >= OPENSEARCH_BULK_MAX_DOCS
+                           or chunk_bytes + entry_bytes > OPENSEARCH_BULK_MAX_BYTES):
+            yield chunk_docs, ''.join(chunk_lines).encode('utf-8')
+            chunk_docs, chunk_lines, chunk_bytes = [], [], 0
+        
+        chunk_docs.append(document)
+        chunk_lines.append(entry)
+        chunk_bytes += entry_bytes
+    
+    if chunk_docs:
+        yield chunk_docs, ''.join(chunk_lines).encode('utf-8')
+
+
+def send_bulk_request(payload):
+    """
+    POST an NDJSON payload to the OpenSearch _bulk API.
+    Returns the parsed response body.
+    """
+    status, response_body = send_opensearch_request('/_bulk', payload, 'application/x-ndjson')
+    if status != 200:
+        logger.error(f"Bulk request failed. Status: {status}, Response: {response_body}")
+        raise Exception(f"OpenSearch bulk request failed: {response_body}")
+    return json.loads(response_body)
+
+
+def parse_bulk_response(documents, result):
+    """
+    Match _bulk response items to the documents that produced them.
+    Returns (retryable, failed, applied): lists of (document, error)
+    tuples, and the documents whose write changed the index (scripted
+    no-ops for stale events are neither failed nor applied).
+    """
+    retryable = []
+    failed = []
+    applied = []
+    
+    for document, item in zip(documents, result.get('items', [])):
+        # Each item is keyed by its action type, e.g. {"index": {...}}
+        outcome = next(iter(item.values()), {})
+        status = outcome.get('status', 500)
+        if status < 300:
+            if outcome.get('result', 'created') != 'noop':
+                applied.append(document)
+            continue
+        # Tombstone for a document that does not exist: already deleted
+        if status == 404 and document.get('deleted'):
+            continue
+        # Partial update of a document deleted or rewritten since it was
+        # read: the newer write wins
+        if status in (404, 409) and 'partialUpdate' in document:
+            logger.info(f"Skipped stale partial update for {document['objectKey']}")
+            continue
+        error = outcome.get('error', f"status {status}")
+        if status in RETRYABLE_BULK_STATUSES:
+            retryable.append((document, error))
+        else:
+            failed.append((document, error))
+    
+    return retryable, failed, applied
+
+
+def record_changes(documents):
+    """
+    Note applied writes: change records go to the change feed buffer (if
+    enabled) and the index generation is marked for a bump. Both are
+    published by publish_changes.
+    """
+    if documents:
+        changes_pending.set()
+    if change_feed is None:
+        return
+    for document in documents:
+        doc_id = make_document_id(document['bucket'], document['objectKey'])
+        change_feed.append(make_change_record(document, doc_id))
+
+
+def delete_applied_derivatives(documents):
+    """
+    Remove the renditions of objects whose tombstone was applied. Deletes
+    are judged by the index write, so a stale delete event (a no-op for a
+    re-uploaded object) leaves the live document's renditions in place.
+    """
+    for document in documents:
+        if document.get('deleted'):
+            delete_derivatives(document['bucket'], document['objectKey'])
+
+
+def publish_changes():
+    """
+    Write buffered change records as a segment and bump the index
+    generation once for all writes since the last call; never fails
+    indexing.
+    """
+    if change_feed is not None:
+        try:
+            change_feed.flush()
+        except Exception as e:
+            logger.error(f"Error writing change feed segment: {str(e)}")
+    if generation_store is not None and changes_pending.is_set():
+        changes_pending.clear()
+        try:
+            logger.info(f"Index generation now {generation_store.bump()}")
+        except Exception as e:
+            changes_pending.set()
+            logger.error(f"Error bumping index generation: {str(e)}")
+
+
+def bulk_index_documents(documents):
+    """
+    Index documents through the OpenSearch _bulk API.
+    Items rejected with a retryable status are resubmitted up to
+    OPENSEARCH_BULK_MAX_RETRIES times, as long as the backoff fits in the
+    current deadline; only those items are resent.
+    Returns list of (document, error) tuples that could not be indexed.
+    """
+    pending = list(documents)
+    failed = []
+    
+    for attempt in range(OPENSEARCH_BULK_MAX_RETRIES + 1):
+        if not pending:
+            break
         
-        # Extract S3 event details
-        for record in event['Records']:
-            bucket = record['s3']['bucket']['name']
-            object_key = record['s3']['object']['key']
-            
-            logger.info(f"Processing: {object_key} from {bucket}")
-            
-            # Detect labels using Rekognition
-            rekognition_response = rekognition_client.detect_labels(
-                Image={
-                    'S3Object': {
-                        'Bucket': bucket,
-                        'Name': object_key
-                    }
-                },
-                MaxLabels=10,
-                MinConfidence=50
-            )
-            
-            # Extract labels from Rekognition response
-            rekognition_labels = [label['Name'].lower() for label in rekognition_response['Labels']]
-            logger.info(f"Rekognition labels: {rekognition_labels}")
-            
-            # Get S3 object metadata to retrieve custom labels
+        retryable = []
+        for chunk_docs, payload in chunk_bulk_actions(pending):
+            result = send_bulk_request(payload)
+            chunk_retryable, chunk_failed, chunk_applied = parse_bulk_response(chunk_docs, result)
+            record_changes(chunk_applied)
+            delete_applied_derivatives(chunk_applied)
+            retryable.extend(chunk_retryable)
+            failed.extend(chunk_failed)
+            indexed = len(chunk_docs) - len(chunk_retryable) - len(chunk_failed)
+            logger.info(f"Bulk indexed {indexed}/{len(chunk_docs)} documents")
+        
+        delay = backoff_delay(attempt)
+        if retryable and attempt < OPENSEARCH_BULK_MAX_RETRIES and get_current_deadline().has(delay):
+            # Item-level 429s are throttling too: shrink concurrency and back off
+            opensearch_limiter.on_throttle()
+            logger.warning(f"Retrying {len(retryable)} bulk items in {delay:.2f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+            pending = [document for document, _ in retryable]
+        else:
+            # Out of attempts, or the backoff would pass the deadline: the
+            # items are reported as failed so the records are retried
+            failed.extend(retryable)
+            pending = []
+    
+    for document, error in failed:
+        logger.error(f"Failed to index {document['objectKey']}: {error}")
+    publish_changes()
+    return failed
+
+
+def get_record_key(record):
+    """
+    Return the decoded object key of an S3 event record
+    (keys arrive URL-encoded, with spaces as '+').
+    """
+    return urllib.parse.unquote_plus(record['s3']['object']['key'])
+
+
+def latest_records(records):
+    """
+    Keep only the newest record per object, judged by S3 sequencer, so a
+    batch holding several events for one key does the work once and a
+    stale event cannot overwrite a newer one. Order is otherwise preserved.
+    """
+    latest = {}
+    for record in records:
+        s3_info = record['s3']
+        object_id = (s3_info['bucket']['name'], get_record_key(record))
+        sequencer = normalize_sequencer(s3_info['object'].get('sequencer')) or ''
+        current = latest.get(object_id)
+        if current is None or sequencer >= current[0]:
+            latest[object_id] = (sequencer, record)
+    kept = {id(record) for _, record in latest.values()}
+    if len(kept) < len(records):
+        logger.info(f"Dropped {len(records) - len(kept)} superseded records")
+    return [record for record in records if id(record) in kept]
+
+
+def process_record(record):
+    """
+    Build the document for one S3 event record; ObjectRemoved events
+    produce a tombstone instead. When bulk indexing is disabled the
+    document is also written here. Returns (object_key, document).
+    """
+    bucket = record['s3']['bucket']['name']
+    object_key = get_record_key(record)
+    sequencer = normalize_sequencer(record['s3']['object'].get('sequencer'))
+    
+    if record.get('eventName', '').startswith('ObjectRemoved:'):
+        logger.info(f"Removing: {object_key} from {bucket}")
+        document = make_tombstone(bucket, object_key, sequencer)
+    else:
+        etag = record['s3']['object'].get('eTag')
+        metadata = None
+        if PREFLIGHT_ENABLED:
+            # Raises ObjectSkipped before any paid call for non-images
+            details = check_object(bucket, object_key)
+            media_type = details.get('mediaType', 'image')
+            metadata = details['metadata']
+        else:
+            media_type = 'video' if VIDEO_ENABLED and is_video_key(object_key) else 'image'
+            if SCHEDULER_LANE_METADATA:
+                # Read here for the lane; the custom labels reuse it
+                metadata = get_object_metadata(bucket, object_key)
+        # API uploads queued as bulk still get interactive enrichment
+        with lane_scope(get_metadata_lane(metadata) or get_current_lane()):
+            if media_type == 'video':
+                document = build_video_document(bucket, object_key, metadata)
+            else:
+                document = build_document(bucket, object_key, etag, metadata)
+        if sequencer:
+            document['s3Sequencer'] = sequencer
+    if not OPENSEARCH_BULK_ENABLED:
+        index_document(document)
+    return object_key, document
+
+
+def process_lanes(records, source=None, deadline=None):
+    """
+    Process S3 event records through the lane scheduler.
+    Each record is isolated: a failure is logged and reported without
+    affecting the others. All records are queued at once; results are
+    yielded per lane, interactive first, as (lane, documents, failures,
+    skipped) where failures maps object key to error message and skipped
+    maps object key to the pre-check's rejection reason.
+    With a deadline, each record runs under its own budget (see
+    INGEST_RECORD_*); records that cannot finish in time are reported
+    as failures starting with 'Deferred' so they are retried.
+    """
+    deadline = deadline or get_current_deadline()
+    # Bulk writes happen after processing, so keep time back for them
+    processing = deadline.shortened(INGEST_WRITE_RESERVE_SECONDS) if OPENSEARCH_BULK_ENABLED else deadline
+    
+    def safe_process(record):
+        try:
+            object_key = get_record_key(record)
+        except Exception:
+            object_key = '<unknown>'
+        if not processing.has(INGEST_RECORD_MIN_SECONDS):
+            return (object_key, None), DeadlineExceeded("not started before the invocation deadline")
+        with deadline_scope(processing.limit(INGEST_RECORD_TIMEOUT_SECONDS)):
             try:
-                metadata_response = s3_client.head_object(Bucket=bucket, Key=object_key)
-                custom_labels_str = metadata_response.get('Metadata', {}).get('customlabels', '')
-                
-                # Parse custom labels (comma-separated)
-                custom_labels = []
-                if custom_labels_str:
-                    custom_labels = [label.strip().lower() for label in custom_labels_str.split(',') if label.strip()]
-                    logger.info(f"Custom labels: {custom_labels}")
+                return process_record(record), None
+            except ObjectSkipped as e:
+                log_skip(record['s3']['bucket']['name'], object_key, e)
+                return (object_key, None), e
             except Exception as e:
-                logger.warning(f"Error retrieving metadata: {str(e)}")
-                custom_labels = []
-            
-            # Combine all labels
-            all_labels = list(set(rekognition_labels + custom_labels))
-            logger.info(f"All labels: {all_labels}")
-            
-            # Get creation timestamp
-            created_timestamp = datetime.utcnow().isoformat()
-            
-            # Create document for OpenSearch
-            document = {
-                "objectKey": object_key,
-                "bucket": bucket,
-                "createdTimestamp": created_timestamp,
-                "labels": all_labels
-            }
-            
-            # Index document in OpenSearch using urllib
-            opensearch_url = f"https://{OPENSEARCH_ENDPOINT}/{OPENSEARCH_INDEX}/_doc"
-            
-            auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode('utf-8')).decode('utf-8')
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Basic {auth}"
-            }
-            
-            req = urllib.request.Request(
-                opensearch_url,
-                data=json.dumps(document).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                response_body = response.read().decode('utf-8')
-                if response.status in [200, 201]:
-                    logger.info(f"Successfully indexed: {object_key}")
-                else:
-                    logger.error(f"Failed to index. Status: {response.status}, Response: {response_body}")
-                    raise Exception(f"OpenSearch indexing failed: {response_body}")
+                # Timeouts caused by the budget running out are retried, not failed
+                if isinstance(e, DeadlineExceeded) or get_current_deadline().expired():
+                    return (object_key, None), DeadlineExceeded(f"record budget exhausted: {str(e)}")
+                logger.error(f"Error processing {object_key}: {str(e)}")
+                return (object_key, None), str(e)
+    
+    futures = {lane: [] for lane in LANES}
+    for record in records:
+        lane = classify_lane(get_record_key(record), source)
+        futures[lane].append((record, record_executor.submit(lane, safe_process, record)))
+    
+    for lane in LANES:
+        documents = []
+        failures = {}
+        skipped = {}
+        for record, future in futures[lane]:
+            try:
+                (object_key, document), error = future.result(timeout=processing.remaining())
+            except FutureTimeoutError:
+                future.cancel()
+                object_key, document = get_record_key(record), None
+                error = DeadlineExceeded("still running at the invocation deadline")
+            if error is None:
+                documents.append(document)
+            elif isinstance(error, ObjectSkipped):
+                skipped[object_key] = error.reason
+            elif isinstance(error, DeadlineExceeded):
+                logger.warning(f"Deferring {object_key}: {str(error)}")
+                failures[object_key] = f"Deferred: {str(error)}"
+            else:
+                failures[object_key] = error
+        if futures[lane]:
+            yield lane, documents, failures, skipped
+
+
+def process_records(records, source=None):
+    """
+    Process S3 event records (see process_lanes) and merge the lanes.
+    Returns (documents, failures, skipped).
+    """
+    documents = []
+    failures = {}
+    skipped = {}
+    for _, lane_documents, lane_failures, lane_skipped in process_lanes(records, source):
+        documents.extend(lane_documents)
+        failures.update(lane_failures)
+        skipped.update(lane_skipped)
+    return documents, failures, skipped
+
+
+def get_scheduler_stats():
+    """Per-lane queue depth, wait and latency for both pools."""
+    return {'records': record_executor.snapshot(), 'enrichment': enrichment_executor.snapshot()}
+
+
+def index_records(records, source=None, deadline=None):
+    """
+    Enrich and index a list of S3 event records.
+    Each lane's documents are bulk-written as soon as that lane finishes,
+    so interactive uploads become searchable without waiting for bulk
+    records in the same batch.
+    Returns summary dict with 'succeeded' keys, 'failed' key -> error and
+    'skipped' key -> reason (objects rejected by the pre-check; these
+    are not failures and are never retried). Records deferred at the
+    deadline are listed under 'failed' so they are retried.
+    """
+    deadline = deadline or get_current_deadline()
+    # Renditions and change feed segments are not photos to index
+    records = [record for record in records
+               if not is_derivative_key(record['s3']['bucket']['name'], get_record_key(record))
+               and not is_change_feed_key(record['s3']['bucket']['name'], get_record_key(record))]
+    
+    documents = []
+    failures = {}
+    skipped = {}
+    lanes = process_lanes(latest_records(records), source, deadline)
+    for lane, lane_documents, lane_failures, lane_skipped in lanes:
+        if OPENSEARCH_BULK_ENABLED and lane_documents:
+            with lane_scope(lane), deadline_scope(deadline):
+                for document, error in bulk_index_documents(lane_documents):
+                    lane_failures[document['objectKey']] = str(error)
+        documents.extend(lane_documents)
+        failures.update(lane_failures)
+        skipped.update(lane_skipped)
+    # Changes from unbatched writes (bulk writes publish their own)
+    publish_changes()
+    
+    summary = {
+        'succeeded': [document['objectKey'] for document in documents
+                      if document['objectKey'] not in failures],
+        'failed': failures,
+        'skipped': skipped
+    }
+    logger.info(f"Summary: {json.dumps(summary)}")
+    logger.info(f"Limiters: {json.dumps(get_limiter_stats())}")
+    logger.info(f"Lanes: {json.dumps(get_scheduler_stats())}")
+    return summary
+
+
+def unwrap_sqs_message(message):
+    """
+    Extract S3 event records from an SQS message body.
+    Accepts raw S3 notifications and SNS-wrapped notifications;
+    s3:TestEvent messages yield no records.
+    """
+    body = json.loads(message['body'])
+    if 'Message' in body and body.get('Type') == 'Notification':
+        body = json.loads(body['Message'])
+    if body.get('Event') == 's3:TestEvent':
+        return []
+    return body.get('Records', [])
+
+
+def handle_sqs_event(event, deadline=None):
+    """
+    Process a batch of SQS messages carrying S3 notifications.
+    Records from every message are indexed together (per bucket, as
+    failures are reported by key) so they share bulk requests; only
+    messages with a failed or deferred record (or an unreadable body or
+    record) are returned in batchItemFailures for redelivery.
+    """
+    records_by_bucket = {}
+    message_ids_by_object = {}
+    failed_message_ids = set()
+    
+    for message in event['Records']:
+        message_id = message['messageId']
+        try:
+            message_records = unwrap_sqs_message(message)
+            object_ids = [(record['s3']['bucket']['name'], get_record_key(record))
+                          for record in message_records]
+        except Exception as e:
+            logger.error(f"Unreadable SQS message {message_id}: {str(e)}")
+            failed_message_ids.add(message_id)
+            continue
+        for record, object_id in zip(message_records, object_ids):
+            message_ids_by_object.setdefault(object_id, set()).add(message_id)
+            records_by_bucket.setdefault(object_id[0], []).append(record)
+    
+    for bucket, records in records_by_bucket.items():
+        summary = index_records(records, source='aws:sqs', deadline=deadline)
+        for object_key in summary['failed']:
+            failed_message_ids.update(message_ids_by_object.get((bucket, object_key), ()))
+    
+    logger.info(f"SQS batch: {len(event['Records'])} messages, {len(failed_message_ids)} failed")
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in sorted(failed_message_ids)]
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Lambda function triggered by S3 PUT and DELETE events, directly or through SQS.
+    Detects labels in images using Rekognition and indexes them in OpenSearch;
+    removed objects are deleted from the index.
+    """
+    try:
+        logger.info(f"Event: {json.dumps(event)}")
+        
+        # Records that cannot finish before the function timeout are handed
+        # back for retry instead of being cut off mid-write
+        deadline = Deadline.from_context(context)
+        
+        records = event.get('Records', [])
+        if records and records[0].get('eventSource') == 'aws:sqs':
+            return handle_sqs_event(event, deadline)
+        
+        # Extract S3 event details and build one document per record
+        summary = index_records(records, source='aws:s3', deadline=deadline)
+        
+        # Fail the invocation so S3 redelivers the event when any record failed or was deferred
+        if summary['failed']:
+            raise Exception(f"Failed to index: {sorted(summary['failed'])}")
         
         return {
             'statusCode': 200,
-            'body': json.dumps('Successfully processed image(s)')
+            'body': json.dumps({**summary, 'limiters': get_limiter_stats(), 'lanes': get_scheduler_stats()})
         }
         
     except Exception as e:
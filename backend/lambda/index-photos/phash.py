@@ -0,0 +1,71 @@
+import io
+import os
+import logging
+
+from image_preprocess import get_object_bytes
+
+logger = logging.getLogger()
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+# Perceptual hash configuration
+PHASH_ENABLED = os.environ.get('PHASH_ENABLED', 'false').lower() == 'true'
+# The 64-bit hash is split into PHASH_SEGMENTS equal segments for
+# multi-index lookup (must divide 64); search-photos uses the same value
+PHASH_SEGMENTS = int(os.environ.get('PHASH_SEGMENTS', '4'))
+
+
+def compute_dhash(data):
+    """
+    Compute a 64-bit difference hash of image bytes.
+    The image is decoded at minimal size (JPEG draft mode), reduced to
+    9x8 grayscale and each bit records whether a pixel is brighter than
+    its right-hand neighbour. Returns the hash as 16 hex digits.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', (64, 64))
+    image = ImageOps.exif_transpose(image).convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = list(image.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return f"{value:016x}"
+
+
+def hash_segments(phash, segments=PHASH_SEGMENTS):
+    """
+    Split a hex hash into position-tagged segments, e.g. '0:ab12'.
+    Stored as a keyword array so candidate lookup is an exact terms query.
+    """
+    value = int(phash, 16)
+    bits = 64 // segments
+    mask = (1 << bits) - 1
+    width = (bits + 3) // 4
+    return [
+        f"{i}:{(value >> (64 - bits * (i + 1))) & mask:0{width}x}"
+        for i in range(segments)
+    ]
+
+
+def compute_phash_fields(bucket, object_key):
+    """
+    Hash an image (shared download) and return its phash and phashSegments fields
+    (empty when disabled, Pillow is unavailable, or on error).
+    """
+    if not PHASH_ENABLED or Image is None:
+        return {}
+    try:
+        phash = compute_dhash(get_object_bytes(bucket, object_key))
+    except Exception as e:
+        logger.warning(f"Error computing perceptual hash for {object_key}: {str(e)}")
+        return {}
+    logger.info(f"Perceptual hash for {object_key}: {phash}")
+    return {'phash': phash, 'phashSegments': hash_segments(phash)}
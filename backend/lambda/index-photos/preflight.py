@@ -0,0 +1,171 @@
+import os
+import json
+import logging
+
+import boto3
+from botocore.config import Config
+
+from deadline import SDK_CONNECT_TIMEOUT, SDK_READ_TIMEOUT
+from image_preprocess import require_conversion
+from throttling import call_with_retry, get_limiter
+from video import VIDEO_ENABLED, VIDEO_MAX_BYTES
+
+logger = logging.getLogger()
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+s3_client = boto3.client('s3', config=Config(retries={'total_max_attempts': 1},
+                                             connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT))
+s3_limiter = get_limiter('s3')
+
+# Pre-check configuration
+PREFLIGHT_ENABLED = os.environ.get('PREFLIGHT_ENABLED', 'true').lower() == 'true'
+PREFLIGHT_SNIFF_BYTES = int(os.environ.get('PREFLIGHT_SNIFF_BYTES', '32'))
+# Rekognition reads S3Object images up to 15 MB; larger (or non-JPEG/PNG)
+# images are converted to JPEG Bytes when they are no larger than this
+REKOGNITION_MAX_OBJECT_BYTES = 15 * 1024 * 1024
+PREFLIGHT_MAX_CONVERT_BYTES = int(os.environ.get('PREFLIGHT_MAX_CONVERT_BYTES', str(64 * 1024 * 1024)))
+PREFLIGHT_CONVERT_ENABLED = os.environ.get('PREFLIGHT_CONVERT_ENABLED', 'true').lower() == 'true'
+
+# Formats Rekognition accepts directly
+NATIVE_FORMATS = {'jpeg', 'png'}
+# Formats that can be converted, keyed to the Pillow plugin that decodes them
+CONVERTIBLE_FORMATS = {'gif': 'GIF', 'bmp': 'BMP', 'webp': 'WEBP', 'tiff': 'TIFF', 'heic': 'HEIF', 'avif': 'AVIF'}
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1'}
+AVIF_BRANDS = {b'avif', b'avis'}
+# Clips handled by the video path (MP4 / QuickTime containers)
+VIDEO_FORMATS = {'mp4', 'mov'}
+QUICKTIME_ATOMS = {b'moov', b'mdat', b'wide', b'free', b'skip'}
+AUDIO_BRANDS = {b'M4A ', b'M4B ', b'M4P '}
+# Content types that are never images; rejected without reading any bytes
+NON_IMAGE_CONTENT_TYPES = ('text/', 'video/', 'audio/', 'application/pdf', 'application/json',
+                           'application/zip', 'application/x-directory')
+
+
+class ObjectSkipped(Exception):
+    """The object is not an image that can be indexed."""
+
+    def __init__(self, reason, details=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.details = details or {}
+
+
+def sniff_format(data):
+    """
+    Identify an image or video format from its leading bytes.
+    Returns a format name ('jpeg', 'png', 'heic', 'mp4', ...) or None.
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:2] == b'BM':
+        return 'bmp'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:4] in (b'II*\0', b'MM\0*'):
+        return 'tiff'
+    if data[4:8] == b'ftyp':
+        if data[8:12] in HEIF_BRANDS:
+            return 'heic'
+        if data[8:12] in AVIF_BRANDS:
+            return 'avif'
+        if data[8:12] in AUDIO_BRANDS:
+            return None
+        return 'mov' if data[8:12] == b'qt  ' else 'mp4'
+    if data[4:8] in QUICKTIME_ATOMS:
+        return 'mov'
+    if data[:4] == b'%PDF':
+        return 'pdf'
+    return None
+
+
+def can_convert(fmt):
+    """True if this Pillow build can decode the format."""
+    if not PREFLIGHT_CONVERT_ENABLED or Image is None or fmt not in CONVERTIBLE_FORMATS:
+        return False
+    Image.init()
+    return CONVERTIBLE_FORMATS[fmt] in Image.OPEN
+
+
+def fetch_head(bucket, object_key):
+    response = call_with_retry(
+        s3_limiter,
+        s3_client.get_object,
+        Bucket=bucket,
+        Key=object_key,
+        Range=f"bytes=0-{PREFLIGHT_SNIFF_BYTES - 1}"
+    )
+    return response['Body'].read()
+
+
+def check_object(bucket, object_key):
+    """
+    Decide whether an object can be labelled before any paid call.
+    Uses head_object size and content type, then a tiny ranged GET to
+    sniff magic bytes. JPEG/PNG within Rekognition's limits pass as-is;
+    other decodable images (or oversized JPEG/PNG) are routed to the
+    conversion path; MP4/MOV clips (with VIDEO_ENABLED) get
+    mediaType 'video'; everything else raises ObjectSkipped.
+    Returns a dict describing the object, including its user 'metadata'.
+    """
+    if object_key.endswith('/'):
+        raise ObjectSkipped('folder-marker')
+
+    try:
+        head = call_with_retry(s3_limiter, s3_client.head_object, Bucket=bucket, Key=object_key)
+    except Exception as e:
+        status = getattr(e, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status == 404:
+            raise ObjectSkipped('missing')
+        raise
+    size = head.get('ContentLength', 0)
+    content_type = (head.get('ContentType') or '').lower()
+    # Returned for later stages (custom labels) so they need no second HEAD
+    metadata = head.get('Metadata', {})
+    details = {'size': size, 'contentType': content_type}
+
+    if size == 0:
+        raise ObjectSkipped('empty', details)
+    if content_type.startswith(NON_IMAGE_CONTENT_TYPES) and not (VIDEO_ENABLED and content_type.startswith('video/')):
+        raise ObjectSkipped('content-type', details)
+
+    fmt = sniff_format(fetch_head(bucket, object_key))
+    details['format'] = fmt
+    if fmt in VIDEO_FORMATS:
+        if not VIDEO_ENABLED:
+            raise ObjectSkipped('video-disabled', details)
+        if size > VIDEO_MAX_BYTES:
+            raise ObjectSkipped('too-large', details)
+        details['mediaType'] = 'video'
+        return dict(details, metadata=metadata)
+    if fmt in NATIVE_FORMATS and size <= REKOGNITION_MAX_OBJECT_BYTES:
+        return dict(details, metadata=metadata)
+    if fmt is None or (fmt not in NATIVE_FORMATS and fmt not in CONVERTIBLE_FORMATS):
+        raise ObjectSkipped('unsupported-format', details)
+    if size > PREFLIGHT_MAX_CONVERT_BYTES:
+        raise ObjectSkipped('too-large', details)
+    if fmt not in NATIVE_FORMATS and not can_convert(fmt):
+        raise ObjectSkipped('unsupported-format', details)
+    if fmt in NATIVE_FORMATS and Image is None:
+        raise ObjectSkipped('too-large', details)
+
+    logger.info(f"Converting {object_key} ({fmt}, {size} bytes) before detection")
+    require_conversion(bucket, object_key)
+    details['converted'] = True
+    return dict(details, metadata=metadata)
+
+
+def log_skip(bucket, object_key, error):
+    """
+    Record a rejected object as one JSON log line (queryable with
+    CloudWatch Logs Insights or a metric filter on "SKIPPED").
+    """
+    entry = {'bucket': bucket, 'objectKey': object_key, 'reason': error.reason, **error.details}
+    logger.info(f"SKIPPED {json.dumps(entry)}")
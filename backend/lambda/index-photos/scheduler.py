@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from deadline import deadline_scope, get_current_deadline
+
+logger = logging.getLogger()
+
+# Lanes in priority order; work outside any lane counts as bulk
+LANES = ('interactive', 'bulk')
+DEFAULT_LANE = 'bulk'
+
+# Weighted fair sharing: when both lanes have waiting work, worker threads
+# and downstream concurrency are split in proportion to these weights;
+# an idle lane's share is lent to the other
+LANE_WEIGHTS = {
+    'interactive': int(os.environ.get('SCHEDULER_INTERACTIVE_WEIGHT', '4')),
+    'bulk': int(os.environ.get('SCHEDULER_BULK_WEIGHT', '1')),
+}
+
+# Interactive lane selection: key prefixes, invocation event sources
+# ('aws:s3' = direct S3 notifications, 'aws:sqs' = ingest queue) and the
+# x-amz-meta-ingest-lane object metadata. Sources alone never put both
+# lanes in one invocation; the metadata (read from the preflight HEAD)
+# is what mixes API uploads into SQS batches
+INTERACTIVE_PREFIXES = tuple(p for p in os.environ.get('SCHEDULER_INTERACTIVE_PREFIXES', '').split(',') if p)
+INTERACTIVE_SOURCES = set(s for s in os.environ.get('SCHEDULER_INTERACTIVE_SOURCES', 'aws:s3').split(',') if s)
+SCHEDULER_LANE_METADATA = os.environ.get('SCHEDULER_LANE_METADATA', 'true').lower() == 'true'
+LANE_METADATA_KEY = 'ingest-lane'
+
+# Samples kept per lane for wait/latency percentiles
+LANE_STATS_WINDOW = 1000
+
+lane_context = threading.local()
+
+
+def get_current_lane():
+    return getattr(lane_context, 'lane', DEFAULT_LANE)
+
+
+@contextmanager
+def lane_scope(lane):
+    """Run the enclosed calls on behalf of a lane (for limiter fairness)."""
+    previous = getattr(lane_context, 'lane', None)
+    lane_context.lane = lane
+    try:
+        yield
+    finally:
+        lane_context.lane = previous if previous is not None else DEFAULT_LANE
+
+
+def classify_lane(object_key, source=None):
+    """
+    Pick the queue for an object without any I/O: interactive when its
+    key has an interactive prefix or it arrived from an interactive
+    event source. Metadata routing happens later (see get_metadata_lane).
+    """
+    if INTERACTIVE_PREFIXES and object_key.startswith(INTERACTIVE_PREFIXES):
+        return 'interactive'
+    if source in INTERACTIVE_SOURCES:
+        return 'interactive'
+    return DEFAULT_LANE
+
+
+def get_metadata_lane(metadata):
+    """
+    Lane named by an object's ingest-lane metadata, or None. Read in the
+    worker from a HEAD it makes anyway, so a record queued as bulk is
+    promoted for its enrichment calls rather than re-queued.
+    """
+    if not SCHEDULER_LANE_METADATA or not metadata:
+        return None
+    lane = metadata.get(LANE_METADATA_KEY)
+    return lane if lane in LANES else None
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[int(fraction * (len(ordered) - 1))] * 1000, 1)
+
+
+class LaneStats:
+    """Queue depth, wait and latency counters for one lane."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth = 0
+        self.waits = deque(maxlen=LANE_STATS_WINDOW)
+        self.latencies = deque(maxlen=LANE_STATS_WINDOW)
+
+    def snapshot(self, depth, running):
+        return {
+            'queued': depth,
+            'running': running,
+            'maxQueued': self.max_depth,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'waitMsP50': percentile(self.waits, 0.5),
+            'waitMsP95': percentile(self.waits, 0.95),
+            'latencyMsP50': percentile(self.latencies, 0.5),
+            'latencyMsP95': percentile(self.latencies, 0.95),
+        }
+
+
+class LaneExecutor:
+    """
+    Thread pool with one FIFO queue per lane.
+    Idle workers take the next task by smooth weighted round-robin over
+    the lanes that have queued work, so interactive tasks never wait
+    behind a long bulk backlog while bulk work still progresses.
+    Tasks run with the lane set as the thread's current lane and with
+    the submitting thread's deadline.
+    """
+
+    def __init__(self, name, max_workers, weights=LANE_WEIGHTS):
+        self.name = name
+        self.max_workers = max(max_workers, 1)
+        self.weights = weights
+        self.queues = {lane: deque() for lane in LANES}
+        self.credits = {lane: 0 for lane in LANES}
+        self.running = {lane: 0 for lane in LANES}
+        self.stats = {lane: LaneStats() for lane in LANES}
+        self.workers = 0
+        self.idle = 0
+        self.condition = threading.Condition()
+
+    def submit(self, lane, fn, *args, **kwargs):
+        future = Future()
+        with self.condition:
+            queue = self.queues[lane]
+            queue.append((future, fn, args, kwargs, get_current_deadline(), time.perf_counter()))
+            stats = self.stats[lane]
+            stats.submitted += 1
+            stats.max_depth = max(stats.max_depth, len(queue))
+            if self.idle:
+                self.condition.notify()
+            elif self.workers < self.max_workers:
+                self.workers += 1
+                threading.Thread(target=self.work, name=f"{self.name}-{self.workers}", daemon=True).start()
+        return future
+
+    def next_task(self):
+        """Pop the next task by smooth weighted round-robin (lock held)."""
+        ready = [lane for lane in LANES if self.queues[lane]]
+        if not ready:
+            return None, None
+        total = 0
+        for lane in ready:
+            self.credits[lane] += self.weights[lane]
+            total += self.weights[lane]
+        lane = max(ready, key=lambda name: self.credits[name])
+        self.credits[lane] -= total
+        return lane, self.queues[lane].popleft()
+
+    def work(self):
+        while True:
+            with self.condition:
+                lane, task = self.next_task()
+                while task is None:
+                    self.idle += 1
+                    self.condition.wait()
+                    self.idle -= 1
+                    lane, task = self.next_task()
+                self.running[lane] += 1
+            future, fn, args, kwargs, deadline, enqueued = task
+            started = time.perf_counter()
+            if future.set_running_or_notify_cancel():
+                with lane_scope(lane), deadline_scope(deadline):
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            with self.condition:
+                self.running[lane] -= 1
+                stats = self.stats[lane]
+                stats.completed += 1
+                stats.waits.append(started - enqueued)
+                stats.latencies.append(time.perf_counter() - enqueued)
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                lane: self.stats[lane].snapshot(len(self.queues[lane]), self.running[lane])
+                for lane in LANES
+            }
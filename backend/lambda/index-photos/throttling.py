@@ -0,0 +1,213 @@
+import os
+import random
+import socket
+import threading
+import time
+import logging
+import urllib.error
+
+from deadline import DeadlineExceeded, get_current_deadline
+from scheduler import LANES, LANE_WEIGHTS, get_current_lane
+
+logger = logging.getLogger()
+
+# Retry configuration
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '5'))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '0.1'))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '5'))
+
+# AIMD concurrency limiter configuration
+ADAPTIVE_INITIAL_CONCURRENCY = float(os.environ.get('ADAPTIVE_INITIAL_CONCURRENCY', '8'))
+ADAPTIVE_MIN_CONCURRENCY = float(os.environ.get('ADAPTIVE_MIN_CONCURRENCY', '1'))
+ADAPTIVE_MAX_CONCURRENCY = float(os.environ.get('ADAPTIVE_MAX_CONCURRENCY', '64'))
+ADAPTIVE_DECREASE_FACTOR = float(os.environ.get('ADAPTIVE_DECREASE_FACTOR', '0.5'))
+
+THROTTLE_ERROR_CODES = {
+    'ThrottlingException',
+    'ProvisionedThroughputExceededException',
+    'LimitExceededException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'SlowDown',
+}
+THROTTLE_HTTP_STATUSES = {429, 503}
+TRANSIENT_HTTP_STATUSES = {500, 502, 504}
+
+
+class ThrottledError(Exception):
+    """Raised by callers to signal a throttle that is not an exception from the SDK."""
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter.
+    The limit grows by roughly one slot per limit's worth of successful
+    calls and is multiplied by ADAPTIVE_DECREASE_FACTOR on each throttle.
+    Callers block in acquire() while in-flight calls are at the limit.
+    Freed slots go to the waiting scheduler lane with the lowest in-flight
+    count relative to its weight, so lanes share the limit fairly.
+    """
+
+    def __init__(self, name, initial=ADAPTIVE_INITIAL_CONCURRENCY,
+                 minimum=ADAPTIVE_MIN_CONCURRENCY, maximum=ADAPTIVE_MAX_CONCURRENCY,
+                 decrease_factor=ADAPTIVE_DECREASE_FACTOR):
+        self.name = name
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.failures = 0
+        self.lane_in_flight = {lane: 0 for lane in LANES}
+        self.lane_waiting = {lane: 0 for lane in LANES}
+        self.condition = threading.Condition()
+
+    def next_lane(self):
+        """Waiting lane furthest below its weighted share (lock held)."""
+        waiting = [lane for lane in LANES if self.lane_waiting[lane]]
+        return min(waiting, key=lambda lane: self.lane_in_flight[lane] / LANE_WEIGHTS[lane])
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a slot. Returns False if none was free within timeout
+        seconds (None waits indefinitely).
+        """
+        lane = get_current_lane()
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.lane_waiting[lane] += 1
+            while self.in_flight >= max(int(self.limit), 1) or self.next_lane() != lane:
+                remaining = None if expires_at is None else expires_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.lane_waiting[lane] -= 1
+                    self.condition.notify_all()
+                    return False
+                self.condition.wait(remaining)
+            self.lane_waiting[lane] -= 1
+            self.in_flight += 1
+            self.lane_in_flight[lane] += 1
+            # Another lane may now be next in line for remaining capacity
+            self.condition.notify_all()
+        return True
+
+    def release(self):
+        lane = get_current_lane()
+        with self.condition:
+            self.in_flight -= 1
+            self.lane_in_flight[lane] -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        with self.condition:
+            self.successes += 1
+            self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            self.condition.notify_all()
+
+    def on_throttle(self):
+        with self.condition:
+            self.throttles += 1
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        logger.warning(f"{self.name} throttled, concurrency limit now {self.limit:.1f}")
+
+    def on_retry(self):
+        with self.condition:
+            self.retries += 1
+
+    def on_failure(self):
+        with self.condition:
+            self.failures += 1
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                'limit': round(self.limit, 2),
+                'inFlight': self.in_flight,
+                'laneInFlight': dict(self.lane_in_flight),
+                'successes': self.successes,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'failures': self.failures
+            }
+
+
+def classify_error(error):
+    """
+    Classify an exception as 'throttle', 'transient' or None (not retryable).
+    """
+    if isinstance(error, ThrottledError):
+        return 'throttle'
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code')
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if code in THROTTLE_ERROR_CODES or status in THROTTLE_HTTP_STATUSES:
+            return 'throttle'
+        if status in TRANSIENT_HTTP_STATUSES:
+            return 'transient'
+        return None
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code in THROTTLE_HTTP_STATUSES:
+            return 'throttle'
+        if error.code in TRANSIENT_HTTP_STATUSES:
+            return 'transient'
+        return None
+    if isinstance(error, (urllib.error.URLError, socket.timeout, ConnectionError)):
+        return 'transient'
+    return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def call_with_retry(limiter, func, *args, **kwargs):
+    """
+    Call func under the limiter, retrying throttles and transient errors
+    with exponential backoff and jitter. Throttles also shrink the
+    limiter's concurrency. Re-raises the last error when attempts run out
+    or the backoff would pass the current deadline; raises
+    DeadlineExceeded if the deadline has passed before an attempt.
+    """
+    deadline = get_current_deadline()
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        if deadline.expired() or not limiter.acquire(deadline.remaining()):
+            raise DeadlineExceeded(f"{limiter.name} call not started: deadline reached")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == 'throttle':
+                limiter.on_throttle()
+            delay = backoff_delay(attempt)
+            if kind is None or attempt == RETRY_MAX_ATTEMPTS - 1 or not deadline.has(delay):
+                limiter.on_failure()
+                raise
+            limiter.on_retry()
+            logger.info(f"{limiter.name} {kind} error, retrying in {delay:.2f}s: {str(e)}")
+        else:
+            limiter.on_success()
+            return result
+        finally:
+            limiter.release()
+        time.sleep(delay)
+
+
+# One limiter per downstream service, shared across threads and warm invocations
+LIMITERS = {
+    'rekognition': AdaptiveLimiter('rekognition'),
+    's3': AdaptiveLimiter('s3'),
+    'opensearch': AdaptiveLimiter('opensearch'),
+}
+
+
+def get_limiter(name):
+    return LIMITERS[name]
+
+
+def get_limiter_stats():
+    """Return a snapshot of every limiter's state and counters."""
+    return {name: limiter.snapshot() for name, limiter in LIMITERS.items()}
@@ -0,0 +1,166 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import logging
+
+import boto3
+
+from deadline import get_current_deadline
+
+logger = logging.getLogger()
+
+s3_client = boto3.client('s3')
+
+# Video ingest configuration (needs ffmpeg/ffprobe, e.g. from a Lambda layer)
+VIDEO_ENABLED = os.environ.get('VIDEO_ENABLED', 'false').lower() == 'true'
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_PATH = os.environ.get('FFPROBE_PATH', 'ffprobe')
+# Candidate frames are sampled at this rate, lowered for long clips so at
+# most VIDEO_MAX_CANDIDATES are decoded
+VIDEO_SAMPLE_FPS = float(os.environ.get('VIDEO_SAMPLE_FPS', '1'))
+VIDEO_MAX_CANDIDATES = int(os.environ.get('VIDEO_MAX_CANDIDATES', '120'))
+# Candidates whose scene-change score against the previous candidate is
+# below this are dropped as near-identical
+VIDEO_SCENE_THRESHOLD = float(os.environ.get('VIDEO_SCENE_THRESHOLD', '0.3'))
+# Hard cap on detector calls per clip
+VIDEO_MAX_FRAMES = int(os.environ.get('VIDEO_MAX_FRAMES', '16'))
+# Decode only keyframes (much faster; sampling is limited to the GOP spacing)
+VIDEO_KEYFRAMES_ONLY = os.environ.get('VIDEO_KEYFRAMES_ONLY', 'true').lower() == 'true'
+VIDEO_FRAME_WIDTH = int(os.environ.get('VIDEO_FRAME_WIDTH', '640'))
+VIDEO_MAX_BYTES = int(os.environ.get('VIDEO_MAX_BYTES', str(1024 * 1024 * 1024)))
+VIDEO_TIMEOUT_SECONDS = int(os.environ.get('VIDEO_TIMEOUT_SECONDS', '120'))
+
+VIDEO_SUFFIXES = ('.mp4', '.mov', '.m4v')
+PTS_TIME = re.compile(r'pts_time:\s*([0-9.]+)')
+
+
+def is_video_key(object_key):
+    return object_key.lower().endswith(VIDEO_SUFFIXES)
+
+
+def get_object_url(bucket, object_key):
+    """
+    Presigned URL for ffmpeg; it issues range requests, so only the
+    container index and the sampled frames' data are read.
+    """
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': object_key},
+        ExpiresIn=VIDEO_TIMEOUT_SECONDS * 2
+    )
+
+
+def probe_duration(url):
+    output = subprocess.run(
+        [FFPROBE_PATH, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', url],
+        capture_output=True, text=True, check=True, timeout=get_current_deadline().timeout(VIDEO_TIMEOUT_SECONDS)
+    ).stdout.strip()
+    return float(output) if output and output != 'N/A' else None
+
+
+def get_sample_interval(duration):
+    """Seconds between candidate frames, so candidates stay bounded."""
+    interval = 1.0 / VIDEO_SAMPLE_FPS
+    if duration:
+        interval = max(interval, duration / VIDEO_MAX_CANDIDATES)
+    return interval
+
+
+def extract_keyframes(url, duration, workdir):
+    """
+    Decode sampled frames that start a new scene, as small JPEGs.
+    One ffmpeg pass: fps sampling, then a scene-change select (the first
+    candidate is always kept), then a resize. Returns list of
+    (timestamp_seconds, path) in presentation order.
+    """
+    interval = get_sample_interval(duration)
+    filters = (
+        f"fps=1/{interval:.3f},"
+        f"select='eq(n\\,0)+gt(scene\\,{VIDEO_SCENE_THRESHOLD})',"
+        f"scale='min({VIDEO_FRAME_WIDTH}\\,iw)':-2,showinfo"
+    )
+    command = [FFMPEG_PATH, '-nostdin', '-hide_banner']
+    if VIDEO_KEYFRAMES_ONLY:
+        command += ['-skip_frame', 'nokey']
+    command += [
+        '-i', url, '-an', '-sn', '-dn', '-vf', filters,
+        '-vsync', 'vfr', '-frames:v', str(VIDEO_MAX_CANDIDATES), '-q:v', '3',
+        os.path.join(workdir, 'frame-%04d.jpg')
+    ]
+    # Bounded by the record's deadline as well as VIDEO_TIMEOUT_SECONDS
+    result = subprocess.run(command, capture_output=True, text=True,
+                            timeout=get_current_deadline().timeout(VIDEO_TIMEOUT_SECONDS))
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr[-500:]}")
+
+    timestamps = [float(t) for t in PTS_TIME.findall(result.stderr)]
+    paths = sorted(name for name in os.listdir(workdir) if name.startswith('frame-'))
+    return [(timestamp, os.path.join(workdir, name)) for timestamp, name in zip(timestamps, paths)]
+
+
+def pick_evenly(frames, limit):
+    """Keep at most limit frames spread across the clip (first and last kept)."""
+    if len(frames) <= limit:
+        return frames
+    if limit == 1:
+        return frames[:1]
+    step = (len(frames) - 1) / (limit - 1)
+    return [frames[round(i * step)] for i in range(limit)]
+
+
+def aggregate_labels(frame_labels):
+    """
+    Merge per-frame labels into (labels, timeline). The timeline lists
+    each label once with the timestamp of its first sampled frame and the
+    number of frames it appeared in, ordered by first appearance.
+    """
+    first_seen = {}
+    frame_counts = {}
+    for timestamp, labels in sorted(frame_labels):
+        for label in labels:
+            first_seen.setdefault(label, timestamp)
+            frame_counts[label] = frame_counts.get(label, 0) + 1
+    timeline = [
+        {'label': label, 'firstSeen': round(first_seen[label], 2), 'frames': frame_counts[label]}
+        for label in sorted(first_seen, key=lambda name: (first_seen[name], name))
+    ]
+    return [entry['label'] for entry in timeline], timeline
+
+
+def detect_video_labels(bucket, object_key, detector, submit):
+    """
+    Sample scene keyframes from a video and label them in parallel.
+    submit(fn, *args) schedules one detector call and returns a future.
+    Detector calls are capped at VIDEO_MAX_FRAMES however long the clip.
+    Returns dict with labels, labelTimeline, duration, frameCount and
+    the detector's model version.
+    """
+    url = get_object_url(bucket, object_key)
+    duration = probe_duration(url)
+    workdir = tempfile.mkdtemp(prefix='keyframes-')
+    try:
+        frames = pick_evenly(extract_keyframes(url, duration, workdir), VIDEO_MAX_FRAMES)
+        futures = []
+        for timestamp, path in frames:
+            with open(path, 'rb') as f:
+                futures.append((timestamp, submit(detector.detect_bytes, f.read())))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    frame_labels = []
+    model_version = None
+    for timestamp, future in futures:
+        labels, model_version = future.result()
+        frame_labels.append((timestamp, labels))
+
+    labels, timeline = aggregate_labels(frame_labels)
+    logger.info(f"Video {object_key}: {len(frames)} keyframes over {duration}s, labels {labels}")
+    return {
+        'labels': labels,
+        'labelTimeline': timeline,
+        'duration': round(duration, 2) if duration else None,
+        'frameCount': len(frames),
+        'modelVersion': model_version
+    }
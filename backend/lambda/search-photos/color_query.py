@@ -0,0 +1,98 @@
+import os
+import re
+
+from local_keywords import STOPWORDS
+
+# Colour words in the query text become colour filters only when enabled.
+# Photos indexed without COLORS_ENABLED have no colour fields, so turn this
+# on once index-photos records colours and older photos are backfilled;
+# until then "black cat" is searched as plain keywords
+COLOR_QUERY_ENABLED = os.environ.get('COLOR_QUERY_ENABLED', 'false').lower() == 'true'
+
+# Named colours stored in the 'colors' field by index-photos
+COLOR_NAMES = {
+    'black', 'gray', 'white', 'red', 'orange', 'yellow',
+    'green', 'teal', 'blue', 'purple', 'pink', 'brown'
+}
+COLOR_SYNONYMS = {
+    'grey': 'gray',
+    'silver': 'gray',
+    'navy': 'blue',
+    'cyan': 'teal',
+    'turquoise': 'teal',
+    'violet': 'purple',
+    'gold': 'yellow',
+    'golden': 'yellow',
+}
+
+# Must match the histogram quantization in index-photos (4 levels per channel)
+BIN_LEVELS = 4
+BIN_SHIFT = 6
+# A channel within this distance of a level boundary also matches the
+# neighbouring level, so near colours are not split by quantization
+BIN_EDGE_MARGIN = 16
+
+# Words that only restate "photo" or "colour" in a colour query
+# ("blue photos", "red coloured images"); dropped alongside colour terms
+COLOR_QUERY_FILLER = {'photo', 'photos', 'picture', 'pictures', 'image', 'images', 'pic', 'pics',
+                      'color', 'colors', 'colour', 'colours', 'colored', 'coloured'}
+
+HEX_COLOR = re.compile(r'^#?([0-9a-fA-F]{6})$')
+
+
+def color_name(word):
+    """Canonical colour name for a query word, or None."""
+    word = word.lower().strip('.,!?')
+    if word in COLOR_NAMES:
+        return word
+    return COLOR_SYNONYMS.get(word)
+
+
+def hex_to_bins(value):
+    """
+    Histogram bin ids matching a hex colour: its own bin plus neighbours
+    along any channel that sits near a level boundary.
+    """
+    match = HEX_COLOR.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid hex colour: {value}")
+    rgb = bytes.fromhex(match.group(1))
+
+    channel_levels = []
+    for component in rgb:
+        level = component >> BIN_SHIFT
+        levels = {level}
+        offset = component - (level << BIN_SHIFT)
+        if offset < BIN_EDGE_MARGIN and level > 0:
+            levels.add(level - 1)
+        if offset >= (1 << BIN_SHIFT) - BIN_EDGE_MARGIN and level < BIN_LEVELS - 1:
+            levels.add(level + 1)
+        channel_levels.append(sorted(levels))
+
+    return [f"{r}{g}{b}" for r in channel_levels[0] for g in channel_levels[1] for b in channel_levels[2]]
+
+
+def extract_color_terms(query):
+    """
+    Split colour words and #rrggbb tokens out of a free-text query.
+    Returns (color names, bin ids, remaining query text); the colours
+    become filters and the rest goes to keyword extraction. When colours
+    are found, stopwords and filler are dropped from the rest, so
+    "show me blue photos" leaves an empty (colour-only) query.
+    """
+    names = []
+    bins = []
+    remaining = []
+    for word in query.split():
+        name = color_name(word)
+        if name:
+            if name not in names:
+                names.append(name)
+        elif word.startswith('#') and HEX_COLOR.match(word):
+            bins.extend(b for b in hex_to_bins(word) if b not in bins)
+        else:
+            remaining.append(word)
+    if names or bins:
+        remaining = [word for word in remaining
+                     if word.lower().strip('.,!?') not in COLOR_QUERY_FILLER | STOPWORDS]
+    return names, bins, ' '.join(remaining)
@@ -0,0 +1,53 @@
+import os
+import time
+
+# Time kept back from the Lambda timeout for building the response
+DEADLINE_SAFETY_MS = int(os.environ.get('DEADLINE_SAFETY_MS', '300'))
+
+
+class DeadlineExceeded(Exception):
+    """No time is left for the next stage."""
+
+
+class Deadline:
+    """
+    Point in time (monotonic clock) by which the request must be answered.
+    A Deadline created without seconds never expires.
+    """
+
+    def __init__(self, seconds=None):
+        self.expires_at = None if seconds is None else time.monotonic() + max(seconds, 0)
+
+    @classmethod
+    def from_context(cls, context, safety_ms=DEADLINE_SAFETY_MS):
+        """Deadline from a Lambda context's remaining time (unbounded without one)."""
+        get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        if get_remaining is None:
+            return cls()
+        return cls((get_remaining() - safety_ms) / 1000)
+
+    def remaining(self):
+        """Seconds left, or None when unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0)
+
+    def has(self, seconds):
+        """True if at least this many seconds are left."""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def timeout(self, limit=None):
+        """
+        Timeout for one call: the stage's own limit capped by the time
+        left. Raises DeadlineExceeded when no time is left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return limit
+        if remaining <= 0:
+            raise DeadlineExceeded("deadline reached")
+        return remaining if limit is None else min(limit, remaining)
+
+
+NO_DEADLINE = Deadline()
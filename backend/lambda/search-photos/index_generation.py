@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+import logging
+
+import boto3
+
+logger = logging.getLogger()
+
+# Index generation configuration (bumped by index-photos after writes)
+INDEX_GENERATION_BACKEND = os.environ.get('INDEX_GENERATION_BACKEND', 'none')  # none | local | dynamodb
+INDEX_GENERATION_PATH = os.environ.get('INDEX_GENERATION_PATH', '/tmp/index-generation')
+INDEX_GENERATION_TABLE = os.environ.get('INDEX_GENERATION_TABLE', 'photo-index-generation')
+INDEX_GENERATION_KEY = os.environ.get('OPENSEARCH_INDEX', 'photos')
+# The generation is re-read at most this often; it bounds how long a
+# cached result can outlive a write
+INDEX_GENERATION_CHECK_SECONDS = float(os.environ.get('INDEX_GENERATION_CHECK_SECONDS', '1'))
+
+
+class LocalGenerationStore:
+    """
+    Reads the '<generation> <unix time>' file written by index-photos.
+    Stand-in for the DynamoDB store in local runs and tests.
+    """
+
+    def __init__(self, path=INDEX_GENERATION_PATH):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                parts = f.read().split()
+        except FileNotFoundError:
+            return 0, 0.0
+        return int(parts[0]), float(parts[1])
+
+
+class DynamoDBGenerationStore:
+    """Reads the counter item keyed by 'indexName'."""
+
+    def __init__(self, table_name=INDEX_GENERATION_TABLE, key=INDEX_GENERATION_KEY):
+        self.table_name = table_name
+        self.key = key
+        self.client = boto3.client('dynamodb')
+
+    def read(self):
+        item = self.client.get_item(
+            TableName=self.table_name,
+            Key={'indexName': {'S': self.key}}
+        ).get('Item')
+        if not item:
+            return 0, 0.0
+        return int(item['generation']['N']), float(item.get('updatedAt', {}).get('N', '0'))
+
+
+class GenerationReader:
+    """
+    Current index generation, re-read from the store at most every
+    INDEX_GENERATION_CHECK_SECONDS. Store errors are logged and yield
+    None, which makes callers bypass the cache.
+    """
+
+    def __init__(self, store, check_seconds=INDEX_GENERATION_CHECK_SECONDS):
+        self.store = store
+        self.check_seconds = check_seconds
+        self.generation = None
+        self.updated_at = 0.0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns (generation, time of the last bump)."""
+        with self.lock:
+            if time.monotonic() - self.checked_at >= self.check_seconds:
+                try:
+                    self.generation, self.updated_at = self.store.read()
+                    self.checked_at = time.monotonic()
+                except Exception as e:
+                    logger.warning(f"Index generation read failed: {str(e)}")
+                    return None, 0.0
+            return self.generation, self.updated_at
+
+
+def create_generation_reader(backend=INDEX_GENERATION_BACKEND):
+    """
+    Create the reader for INDEX_GENERATION_BACKEND.
+    Returns None when no generation is kept (cached results then expire
+    by TTL only).
+    """
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return GenerationReader(LocalGenerationStore())
+    if backend == 'dynamodb':
+        return GenerationReader(DynamoDBGenerationStore())
+    raise ValueError(f"Unknown INDEX_GENERATION_BACKEND: {backend}")
@@ -4,12 +4,26 @@ import os
 import logging
 import urllib.request
 import base64
+import uuid
+from datetime import datetime
+
+from botocore.config import Config
+
+from color_query import COLOR_QUERY_ENABLED, color_name, extract_color_terms, hex_to_bins
+from deadline import NO_DEADLINE, Deadline
+from index_generation import create_generation_reader
+from lex_memo import create_lex_memo
+from local_keywords import (LOCAL_EXTRACTOR_VOCABULARY_FIELD, LOCAL_EXTRACTOR_VOCABULARY_SIZE, STOPWORDS,
+                            create_local_extractor, tokenize)
+from result_cache import create_result_cache, make_result_key
+from similar import (SIMILAR_MAX_DISTANCE, build_candidate_query,
+                     max_supported_distance, rank_similar)
+from speculation import SPECULATIVE_SEARCH_ENABLED, SpeculativeSearch
+from speculation import stats as speculation_stats
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-lex_client = boto3.client('lexv2-runtime')
-
 # OpenSearch configuration
 OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT')
 OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'photos')
@@ -20,6 +34,28 @@ LEX_BOT_ALIAS_ID = os.environ.get('LEX_BOT_ALIAS_ID')
 OPENSEARCH_USERNAME = os.environ.get('OPENSEARCH_USERNAME', 'admin')
 OPENSEARCH_PASSWORD = os.environ.get('OPENSEARCH_PASSWORD')
 
+# Stage budgets within the Lambda's remaining time. Lex is given at most
+# LEX_TIMEOUT_SECONDS and is skipped (raw query terms are searched instead)
+# unless that plus OPENSEARCH_MIN_SECONDS is left; OpenSearch calls time
+# out after OPENSEARCH_TIMEOUT_SECONDS or at the deadline, if sooner
+LEX_TIMEOUT_SECONDS = float(os.environ.get('LEX_TIMEOUT_SECONDS', '3'))
+OPENSEARCH_TIMEOUT_SECONDS = float(os.environ.get('OPENSEARCH_TIMEOUT_SECONDS', '5'))
+OPENSEARCH_MIN_SECONDS = float(os.environ.get('OPENSEARCH_MIN_SECONDS', '1'))
+
+# One attempt only: a retry would not fit the budget, and the raw query
+# terms are a usable fallback
+lex_client = boto3.client('lexv2-runtime', config=Config(
+    connect_timeout=min(1.0, LEX_TIMEOUT_SECONDS),
+    read_timeout=LEX_TIMEOUT_SECONDS,
+    retries={'total_max_attempts': 1}
+))
+
+# Created once per container so the in-memory tier survives warm
+# invocations; entries are dropped when index-photos bumps the generation
+result_cache = create_result_cache()
+generation_reader = create_generation_reader()
+lex_memo = create_lex_memo()
+
 
 def normalize_keyword(keyword):
     """
@@ -38,9 +74,46 @@ def normalize_keyword(keyword):
     return keyword
 
 
-def extract_keywords_from_lex(query):
+def raw_keywords(query):
+    """
+    Keywords straight from the query text: words longer than two
+    characters, normalized.
+    """
+    return [normalize_keyword(word) for word in query.split() if len(word) > 2]
+
+
+def speculative_terms(query):
+    """
+    Query words as Lex usually returns them (stopwords dropped,
+    normalized); searched speculatively while Lex runs.
+    """
+    return list(dict.fromkeys(normalize_keyword(word) for word in tokenize(query) if word not in STOPWORDS))
+
+
+def extract_keywords(query, deadline=NO_DEADLINE, on_lex_call=None):
+    """
+    Keywords for a query: answered in-process by the local extractor when
+    the query is only known labels and stopwords, otherwise by Lex.
+    """
+    if local_extractor is not None:
+        labels = local_extractor.extract(query)
+        if labels is not None:
+            keywords = [normalize_keyword(label) for label in labels]
+            logger.info(f"Local keywords: {keywords}")
+            return keywords
+    return extract_keywords_from_lex(query, deadline, on_lex_call)
+
+
+def extract_keywords_from_lex(query, deadline=NO_DEADLINE, on_lex_call=None):
     """
     Use Lex bot to extract keywords from natural language query.
+    Keywords are memoized by normalized query, including queries Lex
+    found nothing in, so repeated phrasings skip the Lex round trip.
+    Each call uses its own Lex session; nothing carries over between
+    queries. When the deadline leaves no room for both Lex and the
+    search, Lex is skipped and the raw query terms are used.
+    on_lex_call (if given) is called just before the Lex request, so
+    work can overlap the round trip.
     Returns list of keywords or empty list if no keywords found.
     """
     try:
@@ -48,11 +121,27 @@ def extract_keywords_from_lex(query):
             logger.warning("Lex bot not configured, using query as-is")
             return [query.strip().lower()]
         
+        if lex_memo is not None:
+            found, memoized = lex_memo.get(query)
+            if found:
+                keywords = memoized if memoized is not None else raw_keywords(query)
+                logger.info(f"Lex memo hit: {keywords}")
+                return keywords
+        
+        if not deadline.has(LEX_TIMEOUT_SECONDS + OPENSEARCH_MIN_SECONDS):
+            logger.warning(f"Skipping Lex with {deadline.remaining():.2f}s left, using raw query terms")
+            return raw_keywords(query)
+        
+        if on_lex_call is not None:
+            on_lex_call()
+        
+        # A shared session would let concurrent searches see each other's
+        # dialog state
         response = lex_client.recognize_text(
             botId=LEX_BOT_ID,
             botAliasId=LEX_BOT_ALIAS_ID,
             localeId='en_US',
-            sessionId='search-session',
+            sessionId=uuid.uuid4().hex,
             text=query
         )
         
@@ -74,11 +163,17 @@ def extract_keywords_from_lex(query):
         
         # If no keywords found in slots, try to extract from query
         if not keywords:
+            if lex_memo is not None:
+                lex_memo.put(query, None)
             # Simple fallback: split query into words
             keywords = [word.lower() for word in query.split() if len(word) > 2]
+            normalized = [normalize_keyword(k) for k in keywords]
+        else:
+            # Normalize keywords for better matching
+            normalized = [normalize_keyword(k) for k in keywords]
+            if lex_memo is not None:
+                lex_memo.put(query, normalized)
         
-        # Normalize keywords for better matching
-        normalized = [normalize_keyword(k) for k in keywords]
         logger.info(f"Extracted keywords: {keywords}, normalized: {normalized}")
         return normalized
         
@@ -88,15 +183,96 @@ def extract_keywords_from_lex(query):
         return [normalize_keyword(query.strip().lower())]
 
 
-def search_opensearch(keywords):
+def parse_search_filters(query_params):
+    """
+    Parse optional capture-date, bounding-box and colour filters from
+    query params: capturedFrom / capturedTo (ISO 8601 dates),
+    bbox=minLon,minLat,maxLon,maxLat and color (a colour name or hex
+    value). Raises ValueError on malformed input.
+    """
+    filters = {}
+    for param in ('capturedFrom', 'capturedTo'):
+        value = query_params.get(param)
+        if value:
+            datetime.fromisoformat(value.replace('Z', '+00:00'))
+            filters[param] = value
+    
+    bbox = query_params.get('bbox')
+    if bbox:
+        parts = [float(part) for part in bbox.split(',')]
+        if len(parts) != 4:
+            raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+        min_lon, min_lat, max_lon, max_lat = parts
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError("bbox is out of range")
+        filters['bbox'] = parts
+    
+    color = query_params.get('color')
+    if color:
+        name = color_name(color)
+        if name:
+            filters['colors'] = [name]
+        else:
+            filters['colorBins'] = hex_to_bins(color)
+    return filters
+
+
+def build_filter_clauses(filters):
+    """
+    Convert parsed filters to bool filter clauses (non-scoring, cacheable).
+    Tombstones of deleted photos are always excluded.
+    """
+    clauses = [{"bool": {"must_not": [{"term": {"deleted": True}}]}}]
+    if filters.get('capturedFrom') or filters.get('capturedTo'):
+        date_range = {}
+        if filters.get('capturedFrom'):
+            date_range['gte'] = filters['capturedFrom']
+        if filters.get('capturedTo'):
+            date_range['lte'] = filters['capturedTo']
+        clauses.append({"range": {"capturedAt": date_range}})
+    if filters.get('bbox'):
+        min_lon, min_lat, max_lon, max_lat = filters['bbox']
+        clauses.append({
+            "geo_bounding_box": {
+                "location": {
+                    "top_left": {"lat": max_lat, "lon": min_lon},
+                    "bottom_right": {"lat": min_lat, "lon": max_lon}
+                }
+            }
+        })
+    # Colours match precomputed keyword fields, so no per-document scoring
+    for name in filters.get('colors', []):
+        clauses.append({"term": {"colors": name}})
+    if filters.get('colorBins'):
+        clauses.append({"terms": {"paletteBins": filters['colorBins']}})
+    return clauses
+
+
+def search_opensearch(keywords, filters=None, deadline=NO_DEADLINE):
     """
     Search OpenSearch index for photos matching the keywords.
+    Optional filters (see parse_search_filters) restrict results by
+    capture date, location and colour; a colour-only search (no keywords)
+    returns every photo passing the filters. The request is bounded by
+    the deadline. Results are cached by the canonical keyword set and
+    filters until the index generation changes.
     Returns list of matching photo documents.
     """
     try:
-        if not keywords:
+        filters = filters or {}
+        if not keywords and not (filters.get('colors') or filters.get('colorBins')):
             return []
         
+        cache_key = None
+        generation, generation_updated_at = generation_reader.get() if generation_reader else (None, 0.0)
+        # An unreadable generation means the cache cannot be trusted
+        if result_cache is not None and not (generation_reader is not None and generation is None):
+            cache_key = make_result_key(OPENSEARCH_INDEX, [normalize_keyword(k) for k in keywords], filters)
+            cached = result_cache.get(cache_key, generation)
+            if cached is not None:
+                logger.info(f"Result cache hit: {len(cached)} photos")
+                return cached
+        
         # Build OpenSearch query
         # Search for any of the keywords in the labels array
         # Use wildcard for better matching
@@ -117,47 +293,31 @@ def search_opensearch(keywords):
                     "labels": f"{normalized}*"
                 }
             })
-        
-        query = {
-            "query": {
-                "bool": {
-                    "should": should_clauses,
-                    "minimum_should_match": 1
+            # Words inside multi-word labels (labels.text, see index_manager)
+            should_clauses.append({
+                "match": {
+                    "labels.text": normalized
                 }
-            }
-        }
-        
-        opensearch_url = f"https://{OPENSEARCH_ENDPOINT}/{OPENSEARCH_INDEX}/_search"
-        
-        # Use urllib with basic auth
-        auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode('utf-8')).decode('utf-8')
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Basic {auth}"
-        }
-        
-        req = urllib.request.Request(
-            opensearch_url,
-            data=json.dumps(query).encode('utf-8'),
-            headers=headers,
-            method='POST'
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            response_body = response.read().decode('utf-8')
-            if response.status != 200:
-                logger.error(f"OpenSearch query failed. Status: {response.status}, Response: {response_body}")
-                return []
-            results = json.loads(response_body)
+            })
+            # Match words detected in the image by DetectText
+            should_clauses.append({
+                "match": {
+                    "sceneText": normalized
+                }
+            })
         
-        # Extract photo documents from results
-        photos = []
-        if 'hits' in results and 'hits' in results['hits']:
-            for hit in results['hits']['hits']:
-                if '_source' in hit:
-                    photos.append(hit['_source'])
+        query = {"query": {"bool": {}}}
+        if should_clauses:
+            query["query"]["bool"]["should"] = should_clauses
+            query["query"]["bool"]["minimum_should_match"] = 1
+        filter_clauses = build_filter_clauses(filters)
+        if filter_clauses:
+            query["query"]["bool"]["filter"] = filter_clauses
         
+        photos = run_search(query, deadline.timeout(OPENSEARCH_TIMEOUT_SECONDS))
         logger.info(f"Found {len(photos)} matching photos")
+        if cache_key is not None:
+            result_cache.put(cache_key, generation, photos, generation_updated_at)
         return photos
         
     except Exception as e:
@@ -165,12 +325,112 @@ def search_opensearch(keywords):
         return []
 
 
+def run_search(query, timeout=OPENSEARCH_TIMEOUT_SECONDS):
+    """
+    POST a query body to the index's _search endpoint.
+    Returns list of hit _source documents (empty on a non-200 response).
+    """
+    results = opensearch_search(query, timeout)
+    if results is None:
+        return []
+    
+    # Extract photo documents from results
+    photos = []
+    if 'hits' in results and 'hits' in results['hits']:
+        for hit in results['hits']['hits']:
+            if '_source' in hit:
+                photos.append(hit['_source'])
+    return photos
+
+
+def opensearch_search(query, timeout=OPENSEARCH_TIMEOUT_SECONDS):
+    """
+    POST a query body to the index's _search endpoint.
+    Returns the parsed response, or None on a non-200 response.
+    """
+    opensearch_url = f"https://{OPENSEARCH_ENDPOINT}/{OPENSEARCH_INDEX}/_search"
+    
+    # Use urllib with basic auth
+    auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode('utf-8')).decode('utf-8')
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Basic {auth}"
+    }
+    
+    req = urllib.request.Request(
+        opensearch_url,
+        data=json.dumps(query).encode('utf-8'),
+        headers=headers,
+        method='POST'
+    )
+    
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        response_body = response.read().decode('utf-8')
+        if response.status != 200:
+            logger.error(f"OpenSearch query failed. Status: {response.status}, Response: {response_body}")
+            return None
+        return json.loads(response_body)
+
+
+def fetch_label_vocabulary():
+    """
+    Labels present in the index, from a terms aggregation; the
+    vocabulary of the local keyword extractor.
+    """
+    results = opensearch_search({
+        "size": 0,
+        "aggs": {"labels": {"terms": {"field": LOCAL_EXTRACTOR_VOCABULARY_FIELD,
+                                      "size": LOCAL_EXTRACTOR_VOCABULARY_SIZE}}}
+    })
+    if results is None:
+        raise Exception("Label vocabulary query failed")
+    return [bucket['key'] for bucket in results['aggregations']['labels']['buckets']]
+
+
+# Loads its vocabulary on first use, so cold starts without queries cost nothing
+local_extractor = create_local_extractor(fetch_label_vocabulary)
+
+
+def find_similar_photos(object_key, max_distance=SIMILAR_MAX_DISTANCE, deadline=NO_DEADLINE):
+    """
+    Return photos visually similar to object_key, nearest first.
+    Candidates come from an exact terms lookup on perceptual-hash
+    segments (multi-index hashing), so cost grows with the number of
+    near matches rather than the corpus size; each candidate is then
+    verified by Hamming distance.
+    """
+    try:
+        max_distance = min(max_distance, max_supported_distance())
+        source = run_search({
+            "size": 1,
+            "_source": ["objectKey", "phash"],
+            "query": {"term": {"objectKey.keyword": object_key}}
+        }, deadline.timeout(OPENSEARCH_TIMEOUT_SECONDS))
+        if not source or not source[0].get('phash'):
+            logger.info(f"No perceptual hash indexed for {object_key}")
+            return []
+        phash = source[0]['phash']
+        
+        candidates = run_search(build_candidate_query(phash, exclude_key=object_key),
+                                deadline.timeout(OPENSEARCH_TIMEOUT_SECONDS))
+        similar = rank_similar(phash, candidates, max_distance)
+        logger.info(f"{len(candidates)} candidates, {len(similar)} similar photos for {object_key}")
+        return similar
+        
+    except Exception as e:
+        logger.error(f"Error finding similar photos: {str(e)}")
+        return []
+
+
 def lambda_handler(event, context):
     """
     Lambda function to search photos using natural language queries.
     Receives query from API Gateway and returns matching photos.
     """
     try:
+        # Lex and OpenSearch calls share the invocation's remaining time
+        deadline = Deadline.from_context(context)
+        
         # Handle OPTIONS preflight request for CORS
         http_method = event.get('httpMethod', '')
         if http_method == 'OPTIONS':
@@ -188,7 +448,23 @@ def lambda_handler(event, context):
         query_params = event.get('queryStringParameters') or {}
         query = query_params.get('q', '')
         
-        if not query:
+        # Similar-photo mode: ?similarTo={objectKey}[&maxDistance=N]
+        similar_to = query_params.get('similarTo')
+        if similar_to:
+            try:
+                max_distance = int(query_params.get('maxDistance', SIMILAR_MAX_DISTANCE))
+            except ValueError:
+                max_distance = SIMILAR_MAX_DISTANCE
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(find_similar_photos(similar_to, max_distance, deadline))
+            }
+        
+        if not query and not query_params.get('color'):
             logger.warning("No query parameter provided")
             return {
                 'statusCode': 200,
@@ -201,11 +477,38 @@ def lambda_handler(event, context):
         
         logger.info(f"Search query: {query}")
         
-        # Extract keywords using Lex
-        keywords = extract_keywords_from_lex(query)
+        try:
+            filters = parse_search_filters(query_params)
+        except ValueError as e:
+            logger.warning(f"Invalid search filters: {str(e)}")
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
         
-        if not keywords:
+        # Colour words and #rrggbb tokens become filters; the rest goes to Lex
+        if COLOR_QUERY_ENABLED:
+            color_names, color_bins, query = extract_color_terms(query)
+            if color_names:
+                filters['colors'] = list(dict.fromkeys(filters.get('colors', []) + color_names))
+            if color_bins:
+                filters['colorBins'] = list(dict.fromkeys(filters.get('colorBins', []) + color_bins))
+        
+        # Extract keywords locally or using Lex. In speculative mode the
+        # query's own terms are searched while Lex runs
+        speculation = None
+        if SPECULATIVE_SEARCH_ENABLED and query:
+            speculation = SpeculativeSearch(search_opensearch, speculative_terms(query), filters, deadline)
+        keywords = extract_keywords(query, deadline, speculation.start if speculation else None) if query else []
+        
+        if not keywords and not (filters.get('colors') or filters.get('colorBins')):
             logger.info("No keywords extracted, returning empty results")
+            if speculation is not None:
+                speculation.result(keywords)  # records a started speculative query as wasted
             return {
                 'statusCode': 200,
                 'headers': {
@@ -215,8 +518,18 @@ def lambda_handler(event, context):
                 'body': json.dumps([])
             }
         
-        # Search OpenSearch
-        results = search_opensearch(keywords)
+        # Search OpenSearch, unless the speculative search already has
+        results = speculation.result(keywords) if speculation else None
+        if results is None:
+            results = search_opensearch(keywords, filters, deadline)
+        if result_cache is not None:
+            logger.info(f"Result cache: {json.dumps(result_cache.snapshot())}")
+        if lex_memo is not None:
+            logger.info(f"Lex memo: {json.dumps(lex_memo.snapshot())}")
+        if local_extractor is not None:
+            logger.info(f"Local extractor: {json.dumps(local_extractor.snapshot())}")
+        if speculation is not None:
+            logger.info(f"Speculation: {json.dumps(speculation_stats.snapshot())}")
         
         # Return results
         return {
@@ -0,0 +1,90 @@
+import re
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Lex memo configuration (in-memory, per container)
+LEX_MEMO_MAX_ENTRIES = int(os.environ.get('LEX_MEMO_MAX_ENTRIES', '4096'))  # 0 disables the memo
+LEX_MEMO_TTL_SECONDS = int(os.environ.get('LEX_MEMO_TTL_SECONDS', '3600'))
+# Queries Lex found no slots in; kept shorter so bot updates take effect
+LEX_MEMO_NEGATIVE_TTL_SECONDS = int(os.environ.get('LEX_MEMO_NEGATIVE_TTL_SECONDS', '300'))
+
+# Punctuation other than apostrophes and hyphens does not change what Lex
+# extracts ("Show me dogs!" and "show me  dogs" are the same query)
+PUNCTUATION = re.compile(r"[^\w\s'-]")
+
+
+def normalize_query(query):
+    """
+    Memo key for a query: lower-cased, punctuation removed and
+    whitespace collapsed.
+    """
+    return ' '.join(PUNCTUATION.sub(' ', query.lower()).split())
+
+
+class LexMemo:
+    """
+    Thread-safe LRU of normalized query -> Lex keywords with a TTL.
+    A None value is a negative entry: Lex returned no slots and the raw
+    query terms should be used without asking Lex again.
+    Keeps hit and miss counters for snapshot().
+    """
+
+    def __init__(self, max_entries=LEX_MEMO_MAX_ENTRIES, ttl_seconds=LEX_MEMO_TTL_SECONDS,
+                 negative_ttl_seconds=LEX_MEMO_NEGATIVE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Returns (found, keywords); keywords is None for a negative entry."""
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, list(entry[0]) if entry[0] is not None else None
+
+    def put(self, query, keywords):
+        """Remember Lex's keywords for a query (None: nothing extracted)."""
+        ttl = self.ttl_seconds if keywords is not None else self.negative_ttl_seconds
+        key = normalize_query(query)
+        value = list(keywords) if keywords is not None else None
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'hits': self.hits,
+                'negativeHits': self.negative_hits,
+                'misses': self.misses,
+                'hitRate': round((self.hits + self.negative_hits) / lookups, 3) if lookups else None,
+                'entries': len(self.entries)
+            }
+
+
+def create_lex_memo(max_entries=LEX_MEMO_MAX_ENTRIES):
+    """
+    Create the Lex memo. Returns None when LEX_MEMO_MAX_ENTRIES is 0.
+    """
+    if max_entries <= 0:
+        return None
+    return LexMemo(max_entries)
@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger()
+
+# Local keyword extractor configuration. Queries made only of known labels
+# and stopwords are answered in-process; anything else goes to Lex
+LOCAL_EXTRACTOR_ENABLED = os.environ.get('LOCAL_EXTRACTOR_ENABLED', 'false').lower() == 'true'
+# The Lex bot has two keyword slots; longer queries are left to Lex
+LOCAL_EXTRACTOR_MAX_TERMS = int(os.environ.get('LOCAL_EXTRACTOR_MAX_TERMS', '2'))
+# Label vocabulary: a JSON list of labels, or (if unset) a terms
+# aggregation over the index, reloaded after LOCAL_EXTRACTOR_VOCABULARY_TTL_SECONDS
+LOCAL_EXTRACTOR_VOCABULARY_PATH = os.environ.get('LOCAL_EXTRACTOR_VOCABULARY_PATH')
+LOCAL_EXTRACTOR_VOCABULARY_FIELD = os.environ.get('LOCAL_EXTRACTOR_VOCABULARY_FIELD', 'labels')
+LOCAL_EXTRACTOR_VOCABULARY_SIZE = int(os.environ.get('LOCAL_EXTRACTOR_VOCABULARY_SIZE', '10000'))
+LOCAL_EXTRACTOR_VOCABULARY_TTL_SECONDS = int(os.environ.get('LOCAL_EXTRACTOR_VOCABULARY_TTL_SECONDS', '3600'))
+# A failed load is not retried sooner than this
+LOCAL_EXTRACTOR_RETRY_SECONDS = 60
+
+# Request phrasing and filler that never names what is in a photo (extends
+# the fallback stopword list used by deploy-search-lambda.py)
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'with', 'in', 'on', 'at', 'to', 'for', 'from', 'by',
+    'some', 'any', 'all', 'my', 'our', 'your', 'me', 'us', 'i', 'we', 'you',
+    'show', 'find', 'search', 'get', 'give', 'display', 'look', 'see', 'want', 'please', 'can',
+    'photo', 'photos', 'picture', 'pictures', 'image', 'images', 'pic', 'pics',
+    'containing', 'contains', 'featuring', 'that', 'which', 'there', 'is', 'are', 'have', 'has'
+}
+
+# Words that change the meaning of the query (negation, relations, time);
+# a local bag of labels cannot express them
+AMBIGUOUS_WORDS = {
+    'not', 'no', 'without', 'except', 'but', 'near', 'next', 'beside', 'behind', 'under', 'over',
+    'before', 'after', 'during', 'than', 'like', 'only'
+}
+
+IRREGULAR_PLURALS = {
+    'children': 'child', 'people': 'person', 'men': 'man', 'women': 'woman', 'mice': 'mouse',
+    'geese': 'goose', 'feet': 'foot', 'teeth': 'tooth', 'oxen': 'ox', 'sheep': 'sheep',
+    'fish': 'fish', 'deer': 'deer', 'cacti': 'cactus', 'fungi': 'fungus', 'dice': 'die'
+}
+
+TOKEN = re.compile(r"[a-z0-9]+")
+POSSESSIVE = re.compile(r"['’]s\b")
+# Longest label, in words, matched as one keyword ("christmas tree")
+MAX_PHRASE_WORDS = 3
+
+
+def tokenize(query):
+    """Lower-cased words of a query, possessive 's removed."""
+    return TOKEN.findall(POSSESSIVE.sub('', query.lower()))
+
+
+def lemma_candidates(word):
+    """
+    Possible dictionary forms of a word, most literal first: the word
+    itself, an irregular plural's singular, then regular plural and -ing
+    reversals. The vocabulary decides which one (if any) is right.
+    """
+    candidates = [word]
+    if word in IRREGULAR_PLURALS:
+        candidates.append(IRREGULAR_PLURALS[word])
+    if word.endswith('ies') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')  # puppies -> puppy
+    if word.endswith('ves') and len(word) > 4:
+        candidates += [word[:-3] + 'f', word[:-3] + 'fe']  # leaves -> leaf, knives -> knife
+    if word.endswith('es') and len(word) > 3:
+        candidates.append(word[:-2])  # boxes -> box, beaches -> beach
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')) and len(word) > 2:
+        candidates.append(word[:-1])  # dogs -> dog
+    if word.endswith('ing') and len(word) > 5:
+        base = word[:-3]
+        candidates += [base, base + 'e']  # surfing -> surf, skating -> skate
+        if base[-1] == base[-2]:
+            candidates.append(base[:-1])  # running -> run
+    return candidates
+
+
+def phrase_key(label):
+    """
+    Vocabulary key for a label: its lower-cased words without stopwords,
+    matching how queries are reduced ("Coat of Arms" -> "coat arms").
+    """
+    return ' '.join(word for word in tokenize(label) if word not in STOPWORDS)
+
+
+class LabelVocabulary:
+    """
+    Labels known to exist in the index, keyed by lower-cased words.
+    Loaded through a callable returning a list of labels and reloaded
+    once older than ttl_seconds; a failed load keeps the previous
+    vocabulary (empty at first, which sends every query to Lex).
+    With background (the default) loads run on their own thread, so no
+    request waits for them: queries go to Lex until the first load ends.
+    """
+
+    def __init__(self, loader, ttl_seconds=LOCAL_EXTRACTOR_VOCABULARY_TTL_SECONDS, background=True):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.background = background
+        self.phrases = {}
+        self.reload_at = 0.0
+        self.loading = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            labels = self.loader()
+            phrases = {phrase_key(label): label.lower() for label in labels if phrase_key(label)}
+            with self.lock:
+                self.phrases = phrases
+                self.reload_at = time.monotonic() + self.ttl_seconds
+            logger.info(f"Loaded {len(phrases)} labels for the local keyword extractor")
+        except Exception as e:
+            with self.lock:
+                self.reload_at = time.monotonic() + LOCAL_EXTRACTOR_RETRY_SECONDS
+            logger.warning(f"Label vocabulary load failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.loading = False
+
+    def get(self):
+        """Phrase -> label mapping, starting a reload if due."""
+        with self.lock:
+            due = not self.loading and time.monotonic() >= self.reload_at
+            if due:
+                self.loading = True
+        if due:
+            if self.background:
+                threading.Thread(target=self.load, name='vocabulary', daemon=True).start()
+            else:
+                self.load()
+        with self.lock:
+            return self.phrases
+
+
+class LocalKeywordExtractor:
+    """
+    In-process keyword extraction for plain label queries ("dogs",
+    "show me cats and beaches"). Stopwords are dropped, every remaining
+    word must belong to a known label after lemmatization, and at most
+    max_terms labels may result; otherwise the query is escalated.
+    Counts answers and escalation reasons for snapshot().
+    """
+
+    def __init__(self, vocabulary, max_terms=LOCAL_EXTRACTOR_MAX_TERMS):
+        self.vocabulary = vocabulary
+        self.max_terms = max_terms
+        self.lock = threading.Lock()
+        self.answered = 0
+        self.escalated = {}
+
+    def lookup(self, words, phrases):
+        """Label for a run of words; only the last word may be inflected ("hot dogs")."""
+        for candidate in lemma_candidates(words[-1]):
+            key = ' '.join(words[:-1] + [candidate])
+            if key in phrases:
+                return phrases[key]
+        return None
+
+    def match(self, words, phrases):
+        """
+        Longest-first match of words against label phrases. Returns the
+        labels, or None if some word is not part of any label.
+        """
+        labels = []
+        position = 0
+        while position < len(words):
+            for length in range(min(MAX_PHRASE_WORDS, len(words) - position), 0, -1):
+                label = self.lookup(words[position:position + length], phrases)
+                if label:
+                    labels.append(label)
+                    position += length
+                    break
+            else:
+                return None
+        return labels
+
+    def classify(self, query):
+        """
+        Returns (keywords, None) when the query can be answered locally,
+        or (None, reason) when it needs Lex.
+        """
+        words = tokenize(query)
+        if any(word in AMBIGUOUS_WORDS for word in words):
+            return None, 'ambiguous'
+        content = [word for word in words if word not in STOPWORDS]
+        if not content:
+            return None, 'noTerms'
+        phrases = self.vocabulary.get()
+        if not phrases:
+            return None, 'noVocabulary'
+        labels = self.match(content, phrases)
+        if labels is None:
+            return None, 'unknownWord'
+        labels = list(dict.fromkeys(labels))
+        if len(labels) > self.max_terms:
+            return None, 'tooManyTerms'
+        return labels, None
+
+    def extract(self, query):
+        """Keywords for the query, or None if it must go to Lex."""
+        keywords, reason = self.classify(query)
+        with self.lock:
+            if keywords is None:
+                self.escalated[reason] = self.escalated.get(reason, 0) + 1
+            else:
+                self.answered += 1
+        return keywords
+
+    def snapshot(self):
+        with self.lock:
+            total = self.answered + sum(self.escalated.values())
+            return {
+                'answered': self.answered,
+                'escalated': dict(self.escalated),
+                'coverage': round(self.answered / total, 3) if total else None
+            }
+
+
+def load_vocabulary_file(path=LOCAL_EXTRACTOR_VOCABULARY_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def create_local_extractor(index_loader, enabled=LOCAL_EXTRACTOR_ENABLED):
+    """
+    Create the local extractor, or None when LOCAL_EXTRACTOR_ENABLED is
+    off. index_loader returns the index's labels and is used unless
+    LOCAL_EXTRACTOR_VOCABULARY_PATH names a file.
+    """
+    if not enabled:
+        return None
+    loader = load_vocabulary_file if LOCAL_EXTRACTOR_VOCABULARY_PATH else index_loader
+    vocabulary = LabelVocabulary(loader)
+    # Start the first load during container init rather than on a request
+    vocabulary.get()
+    return LocalKeywordExtractor(vocabulary)
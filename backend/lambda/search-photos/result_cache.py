@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+import boto3
+
+from index_generation import INDEX_GENERATION_BACKEND
+
+logger = logging.getLogger()
+
+# Result cache configuration. Without a generation counter nothing drops
+# entries when the index changes, so caching then has to be chosen explicitly
+RESULT_CACHE_BACKEND = os.environ.get(
+    'RESULT_CACHE_BACKEND', 'memory' if INDEX_GENERATION_BACKEND != 'none' else 'none'
+)  # none | memory | sqlite | dynamodb
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', '300'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '1024'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', '/tmp/result-cache.sqlite3')
+RESULT_CACHE_TABLE = os.environ.get('RESULT_CACHE_TABLE', 'photo-search-cache')
+# Larger result sets stay out of the shared tier (DynamoDB items are
+# limited to 400 KB)
+RESULT_CACHE_MAX_ITEM_BYTES = int(os.environ.get('RESULT_CACHE_MAX_ITEM_BYTES', str(350 * 1024)))
+# Results read this soon after a generation bump may predate the index
+# refresh, so they are served but not cached
+RESULT_CACHE_SETTLE_SECONDS = float(os.environ.get('RESULT_CACHE_SETTLE_SECONDS', '2'))
+
+
+def make_result_key(index, keywords, filters):
+    """
+    Cache key for a search: the index plus the canonical (sorted,
+    de-duplicated) keyword set and the filters, hashed.
+    """
+    canonical = json.dumps(
+        {'index': index, 'keywords': sorted(set(keywords)), 'filters': filters},
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryResultCache:
+    """
+    Thread-safe in-process LRU bounded by entry count and serialized
+    size; survives warm Lambda invocations. Entries expire after
+    ttl_seconds.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            entry, size = self.entries[key]
+            if time.time() - entry['storedAt'] > self.ttl_seconds:
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, size):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (entry, size)
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    def remove(self, key):
+        """Drop an entry (lock held)."""
+        _, size = self.entries.pop(key)
+        self.bytes -= size
+
+
+class SQLiteResultCache:
+    """
+    Shared tier in a local SQLite file.
+    Stand-in for the DynamoDB backend in local runs and tests.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache "
+            "(cache_key TEXT PRIMARY KEY, entry TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT entry, expires_at FROM result_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if not row or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, data):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO result_cache (cache_key, entry, expires_at) VALUES (?, ?, ?)",
+                (key, data, int(time.time()) + self.ttl_seconds)
+            )
+            self.conn.commit()
+
+
+class DynamoDBResultCache:
+    """
+    Shared tier in a DynamoDB table keyed by 'cacheKey'.
+    Expiry relies on DynamoDB TTL on the 'expiresAt' attribute.
+    """
+
+    def __init__(self, table_name=RESULT_CACHE_TABLE, ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.client = boto3.client('dynamodb')
+
+    def get(self, key):
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={'cacheKey': {'S': key}}
+        )
+        item = response.get('Item')
+        # TTL deletion is lazy, so check expiry ourselves
+        if not item or int(item['expiresAt']['N']) < time.time():
+            return None
+        return json.loads(item['entry']['S'])
+
+    def put(self, key, data):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                'cacheKey': {'S': key},
+                'entry': {'S': data},
+                'expiresAt': {'N': str(int(time.time()) + self.ttl_seconds)}
+            }
+        )
+
+
+class ResultCache:
+    """
+    Search results in an in-memory LRU, optionally in front of a shared
+    tier. Each entry records the index generation it was computed at and
+    is ignored once the generation moves on. Shared hits are promoted to
+    memory; shared-tier errors are logged and count as misses.
+    Keeps hit, miss and staleness counters for snapshot().
+    """
+
+    def __init__(self, memory, shared=None):
+        self.memory = memory
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.hits = {'memory': 0, 'shared': 0}
+        self.misses = 0
+        self.stale = 0
+        self.skipped = 0
+        self.max_hit_age = 0.0
+        self.generation = None
+
+    def get(self, key, generation):
+        """Cached results for key at this generation, or None."""
+        tier = 'memory'
+        entry = self.memory.get(key)
+        if entry is None and self.shared is not None:
+            tier = 'shared'
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Result cache read failed: {str(e)}")
+        with self.lock:
+            self.generation = generation
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['generation'] != generation:
+                self.stale += 1
+                self.memory.delete(key)
+                return None
+            self.hits[tier] += 1
+            self.max_hit_age = max(self.max_hit_age, time.time() - entry['storedAt'])
+        if tier == 'shared':
+            self.memory.put(key, entry, len(json.dumps(entry['results'])))
+        return entry['results']
+
+    def put(self, key, generation, results, generation_updated_at=0.0):
+        """Cache results unless the generation was bumped too recently to trust them."""
+        if time.time() - generation_updated_at < RESULT_CACHE_SETTLE_SECONDS:
+            with self.lock:
+                self.skipped += 1
+            return
+        entry = {'generation': generation, 'storedAt': time.time(), 'results': results}
+        data = json.dumps(entry)
+        self.memory.put(key, entry, len(data))
+        if self.shared is not None and len(data) <= RESULT_CACHE_MAX_ITEM_BYTES:
+            try:
+                self.shared.put(key, data)
+            except Exception as e:
+                logger.warning(f"Result cache write failed: {str(e)}")
+
+    def snapshot(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses + self.stale
+            return {
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'stale': self.stale,
+                'notCached': self.skipped,
+                'hitRate': round(hits / lookups, 3) if lookups else None,
+                'entries': len(self.memory.entries),
+                'bytes': self.memory.bytes,
+                'maxHitAgeSeconds': round(self.max_hit_age, 1),
+                'generation': self.generation
+            }
+
+
+def create_result_cache(backend=RESULT_CACHE_BACKEND):
+    """
+    Create the result cache selected by RESULT_CACHE_BACKEND.
+    Returns None when caching is disabled (the default unless
+    INDEX_GENERATION_BACKEND is set).
+    """
+    if backend == 'none':
+        return None
+    if INDEX_GENERATION_BACKEND == 'none':
+        logger.warning(f"Result cache without INDEX_GENERATION_BACKEND: "
+                       f"writes can take {RESULT_CACHE_TTL_SECONDS}s to show up")
+    memory = MemoryResultCache()
+    if backend == 'memory':
+        return ResultCache(memory)
+    if backend == 'sqlite':
+        return ResultCache(memory, SQLiteResultCache())
+    if backend == 'dynamodb':
+        return ResultCache(memory, DynamoDBResultCache())
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {backend}")
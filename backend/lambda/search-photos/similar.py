@@ -0,0 +1,75 @@
+import os
+
+# Must match PHASH_SEGMENTS used by index-photos (a divisor of 64)
+PHASH_SEGMENTS = int(os.environ.get('PHASH_SEGMENTS', '4'))
+SIMILAR_MAX_DISTANCE = int(os.environ.get('SIMILAR_MAX_DISTANCE', '6'))
+SIMILAR_MAX_CANDIDATES = int(os.environ.get('SIMILAR_MAX_CANDIDATES', '500'))
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def max_supported_distance(segments=PHASH_SEGMENTS):
+    """
+    Largest Hamming radius the segment lookup can answer exactly.
+    Querying each segment plus its one-bit variants finds every hash that
+    differs in at most one bit in some segment; by pigeonhole that covers
+    any hash within 2 * segments - 1 bits.
+    """
+    return 2 * segments - 1
+
+
+def segment_terms(phash, segments=PHASH_SEGMENTS, variants=True):
+    """
+    Terms to look up for a hash: each position-tagged segment (same
+    encoding as index-photos) and, with variants, every version of it
+    with one bit flipped.
+    """
+    value = int(phash, 16)
+    bits = 64 // segments
+    mask = (1 << bits) - 1
+    width = (bits + 3) // 4
+    terms = []
+    for i in range(segments):
+        segment = (value >> (64 - bits * (i + 1))) & mask
+        terms.append(f"{i}:{segment:0{width}x}")
+        if not variants:
+            continue
+        for bit in range(bits):
+            terms.append(f"{i}:{segment ^ (1 << bit):0{width}x}")
+    return terms
+
+
+def build_candidate_query(phash, exclude_key=None):
+    """
+    Terms query on phashSegments; candidates are verified by the caller.
+    """
+    query = {
+        "size": SIMILAR_MAX_CANDIDATES,
+        "_source": {"excludes": ["phashSegments"]},
+        "query": {
+            "bool": {
+                "filter": [{"terms": {"phashSegments": segment_terms(phash)}}]
+            }
+        }
+    }
+    if exclude_key:
+        query["query"]["bool"]["must_not"] = [{"term": {"objectKey.keyword": exclude_key}}]
+    return query
+
+
+def rank_similar(phash, candidates, max_distance):
+    """
+    Keep candidates within max_distance of phash, nearest first.
+    Each returned document gains a 'distance' field.
+    """
+    ranked = []
+    for document in candidates:
+        if not document.get('phash'):
+            continue
+        distance = hamming_distance(phash, document['phash'])
+        if distance <= max_distance:
+            ranked.append({**document, 'distance': distance})
+    ranked.sort(key=lambda document: document['distance'])
+    return ranked
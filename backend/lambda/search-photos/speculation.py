@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+# Speculative search configuration: while Lex runs, the locally tokenized
+# query terms are already searched; the result is used if Lex agrees
+SPECULATIVE_SEARCH_ENABLED = os.environ.get('SPECULATIVE_SEARCH_ENABLED', 'false').lower() == 'true'
+# A wasted query keeps its worker until it finishes, so allow a few
+SPECULATIVE_SEARCH_WORKERS = int(os.environ.get('SPECULATIVE_SEARCH_WORKERS', '4'))
+
+executor = ThreadPoolExecutor(max_workers=SPECULATIVE_SEARCH_WORKERS, thread_name_prefix='speculative')
+
+
+class SpeculationStats:
+    """
+    Per-container counters: speculative queries started, used (hits) and
+    wasted (Lex chose different keywords, or the query failed), plus the
+    Lex/search overlap saved by the hits.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.wasted = 0
+        self.saved_seconds = 0.0
+
+    def record(self, outcome, saved_seconds=0.0):
+        with self.lock:
+            if outcome == 'started':
+                self.started += 1
+            elif outcome == 'hit':
+                self.hits += 1
+                self.saved_seconds += saved_seconds
+            else:
+                self.wasted += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'hits': self.hits,
+                'wasted': self.wasted,
+                'hitRate': round(self.hits / self.started, 3) if self.started else None,
+                'savedMs': round(self.saved_seconds * 1000)
+            }
+
+
+stats = SpeculationStats()
+
+
+class SpeculativeSearch:
+    """
+    One speculative query. start() runs search(terms, filters, deadline)
+    on the shared executor and is meant to be called right before Lex;
+    result(keywords) returns its results if Lex's keywords match the
+    speculated terms, otherwise None and the query counts as wasted.
+    Keyword lists match when their sets are equal.
+    """
+
+    def __init__(self, search, terms, filters, deadline):
+        self.search = search
+        self.terms = terms
+        self.filters = filters
+        self.deadline = deadline
+        self.future = None
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        if not self.terms or self.future is not None:
+            return
+        self.started_at = time.monotonic()
+        self.future = executor.submit(self.run)
+        stats.record('started')
+
+    def run(self):
+        try:
+            return self.search(self.terms, self.filters, self.deadline)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def result(self, keywords):
+        if self.future is None:
+            return None
+        lex_done = time.monotonic()
+        if set(keywords) != set(self.terms):
+            stats.record('wasted')
+            logger.info(f"Speculative search wasted: Lex chose {keywords}, speculated {self.terms}")
+            return None
+        try:
+            results = self.future.result(timeout=self.deadline.remaining())
+        except Exception as e:
+            stats.record('wasted')
+            logger.warning(f"Speculative search failed: {str(e)}")
+            return None
+        # The hit saved whichever of the two overlapping stages was shorter
+        stats.record('hit', min(lex_done, self.finished_at) - self.started_at)
+        logger.info(f"Speculative search hit: {self.terms}")
+        return results
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Backfill or rebuild the photos index from objects already in the bucket.
+
+Keys are streamed page by page from list_objects_v2, enriched on a worker
+pool with the index-photos build logic and written through the _bulk API.
+As in the Lambda, the preflight check decides which objects are images or
+videos; generated derivatives and change feed segments are never listed.
+Documents are written with the Lambda's sequencer-guarded upsert, using a
+sequencer derived from LastModified that is older than any S3 event, so
+photos re-uploaded or deleted while the backfill runs keep the event's
+version. After every bulk flush the last completed key is checkpointed,
+so an interrupted run resumes with --resume. Throughput and ETA are
+reported as the run progresses. With --bulk-load the target index runs
+without refresh or replicas during the import and is force-merged after.
+
+Uses the same OPENSEARCH_* / REKOGNITION_* / LABEL_CACHE_* environment
+variables as the index-photos Lambda.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+# Each backfill worker fans out several enrichment calls; size the shared
+# enrichment pool for the default worker count before the module creates it
+os.environ.setdefault('ENRICHMENT_MAX_WORKERS', '96')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+import index_manager  # noqa: E402
+import lambda_function  # noqa: E402
+
+REGION = 'us-east-1'
+REPORT_INTERVAL_SECONDS = 10
+
+
+def load_checkpoint(path):
+    """Return the last completed key from the checkpoint file, if any."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get('lastKey')
+
+
+def save_checkpoint(path, last_key, stats):
+    """Atomically write the checkpoint file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'lastKey': last_key, 'stats': stats}, f)
+    os.replace(tmp_path, path)
+
+
+def iter_keys(s3, bucket, prefix, start_after):
+    """Stream (key, etag, last_modified) for source objects, in key order."""
+    paginator = s3.get_paginator('list_objects_v2')
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    for page in paginator.paginate(**params):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if lambda_function.is_derivative_key(bucket, key) or lambda_function.is_change_feed_key(bucket, key):
+                continue
+            yield key, obj.get('ETag'), obj['LastModified']
+
+
+class Progress:
+    """Tracks throughput; the total is counted by a background listing."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.total = None
+        self.last_report = 0
+
+    def count_total(self, s3, bucket, prefix, start_after):
+        self.total = sum(1 for _ in iter_keys(s3, bucket, prefix, start_after))
+
+    def report(self, force=False):
+        now = time.time()
+        if not force and now - self.last_report < REPORT_INTERVAL_SECONDS:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-6)
+        rate = self.done / elapsed
+        line = f"{self.done} indexed, {self.failed} failed, {self.skipped} skipped, {rate:.1f} photos/s"
+        if self.total is not None and rate > 0:
+            remaining = max(self.total - self.done - self.failed - self.skipped, 0)
+            line += f", {remaining} remaining, ETA {remaining / rate / 60:.1f} min"
+        print(line, flush=True)
+
+
+def run_backfill(bucket, prefix, workers, batch_size, checkpoint_path, resume, failures_path):
+    s3 = boto3.client('s3', region_name=REGION)
+    start_after = load_checkpoint(checkpoint_path) if resume else None
+    if start_after:
+        print(f"Resuming after {start_after}")
+
+    progress = Progress()
+    threading.Thread(
+        target=progress.count_total, args=(s3, bucket, prefix, start_after), daemon=True
+    ).start()
+
+    def build(key, etag, last_modified):
+        try:
+            metadata = None
+            if lambda_function.PREFLIGHT_ENABLED:
+                details = lambda_function.check_object(bucket, key)
+                media_type = details.get('mediaType', 'image')
+                metadata = details['metadata']
+            else:
+                is_video = lambda_function.VIDEO_ENABLED and lambda_function.is_video_key(key)
+                media_type = 'video' if is_video else 'image'
+            if media_type == 'video':
+                document = lambda_function.build_video_document(bucket, key, metadata)
+            else:
+                document = lambda_function.build_document(bucket, key, etag, metadata)
+            document['s3Sequencer'] = lambda_function.make_backfill_sequencer(last_modified)
+            return key, document, None
+        except lambda_function.ObjectSkipped as e:
+            lambda_function.log_skip(bucket, key, e)
+            return key, None, None
+        except Exception as e:
+            return key, None, str(e)
+
+    failures_file = open(failures_path, 'a')
+
+    def record_failure(key, error):
+        progress.failed += 1
+        failures_file.write(json.dumps({'key': key, 'error': error}) + '\n')
+
+    buffer = []
+    last_key = start_after
+
+    def flush():
+        if buffer:
+            failed = lambda_function.bulk_index_documents([document for _, document in buffer])
+            for document, error in failed:
+                record_failure(document['objectKey'], str(error))
+            progress.done += len(buffer) - len(failed)
+            buffer.clear()
+        failures_file.flush()
+        save_checkpoint(checkpoint_path, last_key,
+                        {'done': progress.done, 'failed': progress.failed, 'skipped': progress.skipped})
+
+    def consume(future):
+        nonlocal last_key
+        key_done, document, error = future.result()
+        last_key = key_done
+        if error:
+            record_failure(key_done, error)
+        elif document is None:
+            progress.skipped += 1
+        else:
+            buffer.append((key_done, document))
+        if len(buffer) >= batch_size:
+            flush()
+        progress.report()
+
+    # Futures are consumed in submission (key) order so the checkpoint
+    # never skips past a key that is still in flight
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, etag, last_modified in iter_keys(s3, bucket, prefix, start_after):
+            in_flight.append(executor.submit(build, key, etag, last_modified))
+            while len(in_flight) >= workers * 4 or (in_flight and in_flight[0].done()):
+                consume(in_flight.popleft())
+        while in_flight:
+            consume(in_flight.popleft())
+
+    flush()
+    failures_file.close()
+    progress.report(force=True)
+    print(f"Backfill complete. Failures logged to {failures_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('bucket')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--index', help='Target index (default: OPENSEARCH_INDEX)')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--checkpoint', default='backfill-checkpoint.json')
+    parser.add_argument('--failures', default='backfill-failures.ndjson')
+    parser.add_argument('--resume', action='store_true', help='Continue after the checkpointed key')
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Disable refresh and replicas during the run, then restore and force-merge')
+    args = parser.parse_args()
+
+    if args.index:
+        lambda_function.OPENSEARCH_INDEX = args.index
+    if args.bulk_load:
+        # The index must exist (with the template's mapping) before its settings change
+        index_manager.install_template(lambda_function.OPENSEARCH_INDEX)
+        if not index_manager.index_exists(lambda_function.OPENSEARCH_INDEX):
+            index_manager.opensearch_request('PUT', f"/{lambda_function.OPENSEARCH_INDEX}", {})
+        with index_manager.bulk_load(lambda_function.OPENSEARCH_INDEX):
+            run_backfill(args.bucket, args.prefix, args.workers, args.batch_size,
+                         args.checkpoint, args.resume, args.failures)
+    else:
+        run_backfill(args.bucket, args.prefix, args.workers, args.batch_size,
+                     args.checkpoint, args.resume, args.failures)
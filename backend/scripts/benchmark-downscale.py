@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark downscale-before-detect against full-resolution S3Object detection.
+For each sampled image, measures end-to-end detect_labels latency and label
+agreement (Jaccard overlap) between the two modes.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+from image_preprocess import downscale_image_bytes  # noqa: E402
+
+REGION = 'us-east-1'
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+
+def list_image_keys(s3, bucket, prefix, limit):
+    """List up to limit image keys under prefix."""
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith(IMAGE_SUFFIXES):
+                keys.append((obj['Key'], obj['Size']))
+                if len(keys) >= limit:
+                    return keys
+    return keys
+
+
+def detect(rekognition, image, max_labels, min_confidence):
+    """Run detect_labels and return (seconds, label set)."""
+    start = time.perf_counter()
+    response = rekognition.detect_labels(Image=image, MaxLabels=max_labels, MinConfidence=min_confidence)
+    elapsed = time.perf_counter() - start
+    return elapsed, {label['Name'].lower() for label in response['Labels']}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def run_benchmark(bucket, prefix, limit, max_dimension, max_labels, min_confidence):
+    s3 = boto3.client('s3', region_name=REGION)
+    rekognition = boto3.client('rekognition', region_name=REGION)
+
+    keys = list_image_keys(s3, bucket, prefix, limit)
+    print(f"Benchmarking {len(keys)} images from s3://{bucket}/{prefix} (max dimension {max_dimension})\n")
+    print(f"{'key':40} {'size MB':>8} {'bytes KB':>9} {'full s':>7} {'down s':>7} {'jaccard':>8}")
+
+    full_times, down_times, overlaps, ratios = [], [], [], []
+    full_failures = 0
+    for key, size in keys:
+        try:
+            full_time, full_labels = detect(
+                rekognition, {'S3Object': {'Bucket': bucket, 'Name': key}}, max_labels, min_confidence
+            )
+        except Exception as e:
+            print(f"{key[:40]:40} full-resolution detect failed: {e}")
+            full_failures += 1
+            full_time, full_labels = None, None
+
+        # Downscaled path includes the download and re-encode in its latency
+        start = time.perf_counter()
+        data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        encoded = downscale_image_bytes(data, max_dimension=max_dimension)
+        prep_time = time.perf_counter() - start
+        detect_time, down_labels = detect(rekognition, {'Bytes': encoded}, max_labels, min_confidence)
+        down_time = prep_time + detect_time
+
+        down_times.append(down_time)
+        ratios.append(len(encoded) / size)
+        if full_labels is not None:
+            full_times.append(full_time)
+            overlaps.append(jaccard(full_labels, down_labels))
+            print(f"{key[:40]:40} {size / 1e6:8.2f} {len(encoded) / 1e3:9.1f} "
+                  f"{full_time:7.3f} {down_time:7.3f} {overlaps[-1]:8.2f}")
+        else:
+            print(f"{key[:40]:40} {size / 1e6:8.2f} {len(encoded) / 1e3:9.1f} {'-':>7} {down_time:7.3f} {'-':>8}")
+
+    print("\nSummary")
+    if full_times:
+        print(f"  full-resolution median latency: {statistics.median(full_times):.3f}s")
+    if down_times:
+        print(f"  downscaled median latency:      {statistics.median(down_times):.3f}s")
+        print(f"  median payload ratio:           {statistics.median(ratios):.3f}")
+    if overlaps:
+        print(f"  mean label Jaccard overlap:     {statistics.mean(overlaps):.3f}")
+    print(f"  full-resolution failures:       {full_failures}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('bucket')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--limit', type=int, default=25)
+    parser.add_argument('--max-dimension', type=int, default=1600)
+    parser.add_argument('--max-labels', type=int, default=10)
+    parser.add_argument('--min-confidence', type=float, default=50)
+    args = parser.parse_args()
+    run_benchmark(args.bucket, args.prefix, args.limit, args.max_dimension,
+                  args.max_labels, args.min_confidence)
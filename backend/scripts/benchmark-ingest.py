@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Measure index-photos ingest throughput with synthetic S3 events.
+
+Defaults to the local label detector, so the run needs no Rekognition
+access; use LOCAL_DETECTOR_LATENCY_MS / LOCAL_DETECTOR_JITTER_MS to model
+detector latency. EXIF extraction, lane metadata and the custom-labels
+HEAD are turned off so no S3 request is made and the timings contain no network latency.
+With --skip-index only enrichment is measured and no OpenSearch endpoint
+is needed.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('LABEL_DETECTOR', 'local')
+os.environ.setdefault('LABEL_CACHE_BACKEND', 'none')
+# Synthetic keys do not exist in S3
+os.environ.setdefault('PREFLIGHT_ENABLED', 'false')
+os.environ.setdefault('EXIF_ENABLED', 'false')
+os.environ.setdefault('SCHEDULER_LANE_METADATA', 'false')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+import lambda_function  # noqa: E402
+
+# Synthetic objects carry no x-amz-meta-customlabels
+lambda_function.get_custom_labels = lambda *args, **kwargs: []
+
+
+def synthetic_records(bucket, count, batch):
+    """Build S3 PUT records for distinct synthetic keys."""
+    return [
+        {
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': bucket},
+                'object': {'key': f"benchmark/{batch:05d}/{i:05d}.jpg", 'eTag': f"{batch}-{i}"}
+            }
+        }
+        for i in range(count)
+    ]
+
+
+def run_benchmark(bucket, batches, batch_size, skip_index):
+    print(f"Detector: {lambda_function.label_detector.name}, workers: {lambda_function.INDEX_MAX_WORKERS}, "
+          f"batches: {batches} x {batch_size}")
+    latencies = []
+    indexed = 0
+    started = time.perf_counter()
+    for batch in range(batches):
+        records = synthetic_records(bucket, batch_size, batch)
+        batch_start = time.perf_counter()
+        if skip_index:
+            documents, failures, skipped = lambda_function.process_records(records)
+            indexed += len(documents)
+        else:
+            summary = lambda_function.index_records(records)
+            indexed += len(summary['succeeded'])
+        latencies.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Processed {indexed} records in {elapsed:.2f}s ({indexed / elapsed:.1f} records/s)")
+    print(f"Batch latency p50 {statistics.median(latencies):.3f}s, "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.3f}s, max {latencies[-1]:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', default='benchmark-bucket')
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--skip-index', action='store_true', help='Measure enrichment only')
+    args = parser.parse_args()
+    run_benchmark(args.bucket, args.batches, args.batch_size, args.skip_index)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Report clusters of near-duplicate photos using their perceptual hashes.
+
+Every document with a phash is scrolled out of OpenSearch once. Pairs are
+found with multi-index hashing: hashes are bucketed by segment, and each
+photo is compared only with photos sharing a segment (or a one-bit variant
+of one), so the run stays far from all-pairs cost on large libraries.
+Photos within --max-distance bits are joined into clusters.
+
+Uses OPENSEARCH_ENDPOINT / OPENSEARCH_INDEX / OPENSEARCH_USERNAME /
+OPENSEARCH_PASSWORD and PHASH_SEGMENTS from the environment.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'search-photos'))
+from similar import PHASH_SEGMENTS, hamming_distance, max_supported_distance, segment_terms  # noqa: E402
+
+OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT')
+OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'photos')
+OPENSEARCH_USERNAME = os.environ.get('OPENSEARCH_USERNAME', 'admin')
+OPENSEARCH_PASSWORD = os.environ.get('OPENSEARCH_PASSWORD')
+
+
+def opensearch_post(path, body):
+    auth = base64.b64encode(f"{OPENSEARCH_USERNAME}:{OPENSEARCH_PASSWORD}".encode()).decode()
+    req = urllib.request.Request(
+        f"https://{OPENSEARCH_ENDPOINT}{path}",
+        data=json.dumps(body).encode('utf-8'),
+        headers={"Content-Type": "application/json", "Authorization": f"Basic {auth}"},
+        method='POST'
+    )
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def scroll_hashes(page_size):
+    """Yield (objectKey, phash) for every document that has a phash."""
+    result = opensearch_post(f"/{OPENSEARCH_INDEX}/_search?scroll=2m", {
+        "size": page_size,
+        "_source": ["objectKey", "phash"],
+        "query": {"exists": {"field": "phash"}}
+    })
+    while result['hits']['hits']:
+        for hit in result['hits']['hits']:
+            yield hit['_source']['objectKey'], hit['_source']['phash']
+        result = opensearch_post("/_search/scroll", {"scroll": "2m", "scroll_id": result['_scroll_id']})
+
+
+def find_clusters(photos, max_distance):
+    """
+    Group (key, phash) pairs into clusters of photos within max_distance.
+    Returns clusters (lists of keys) with more than one member, largest first.
+    """
+    buckets = defaultdict(list)
+    for index, (_, phash) in enumerate(photos):
+        for term in segment_terms(phash, variants=False):
+            buckets[term].append(index)
+
+    # Exact segment matches find every pair closer than the number of
+    # segments (pigeonhole); beyond that, also probe one-bit variants
+    probe_variants = max_distance >= PHASH_SEGMENTS
+
+    parent = list(range(len(photos)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for index, (_, phash) in enumerate(photos):
+        seen = set()
+        for term in segment_terms(phash, variants=probe_variants):
+            for other in buckets.get(term, ()):
+                if other <= index or other in seen:
+                    continue
+                seen.add(other)
+                if hamming_distance(phash, photos[other][1]) <= max_distance:
+                    parent[find(other)] = find(index)
+
+    clusters = defaultdict(list)
+    for index, (key, _) in enumerate(photos):
+        clusters[find(index)].append(key)
+    return sorted((keys for keys in clusters.values() if len(keys) > 1), key=len, reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-distance', type=int, default=6)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--json', action='store_true', help='Print clusters as JSON')
+    args = parser.parse_args()
+
+    max_distance = min(args.max_distance, max_supported_distance())
+    photos = list(scroll_hashes(args.page_size))
+    clusters = find_clusters(photos, max_distance)
+
+    if args.json:
+        print(json.dumps(clusters, indent=2))
+    else:
+        print(f"{len(photos)} hashed photos, {len(clusters)} duplicate clusters (max distance {max_distance})\n")
+        for keys in clusters:
+            print(f"{len(keys)} photos: {', '.join(keys)}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Measure how often the local keyword extractor agrees with Lex.
+
+Every query (one per line, from a file or stdin) is classified by the
+local extractor and also sent to Lex, bypassing the Lex memo. Both
+keyword lists are normalized as search-photos does, and they agree when
+the keyword sets are equal. The confusion matrix treats "answered
+locally" as the prediction and "local matching agrees with Lex" as the
+truth:
+
+  TP  answered, agrees with Lex       FP  answered, disagrees
+  FN  escalated, but would agree      TN  escalated, would disagree
+
+Precision (agreement on answered queries) says whether the fast path is
+safe to enable; recall says how much Lex traffic the escalation rules
+leave on the table. Escalations are also broken down by reason.
+
+Uses OPENSEARCH_* (for the label vocabulary, unless --vocabulary is
+given) and LEX_BOT_ID / LEX_BOT_ALIAS_ID from the environment.
+--dump-vocabulary writes the index's labels to a file usable as
+LOCAL_EXTRACTOR_VOCABULARY_PATH.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'search-photos'))
+import lambda_function  # noqa: E402
+from local_keywords import (LOCAL_EXTRACTOR_MAX_TERMS, STOPWORDS, LabelVocabulary,  # noqa: E402
+                            LocalKeywordExtractor, load_vocabulary_file, tokenize)
+
+
+def keyword_set(keywords):
+    return sorted(set(lambda_function.normalize_keyword(keyword) for keyword in keywords))
+
+
+def evaluate(queries, extractor, show_disagreements=False):
+    counts = {'TP': 0, 'FP': 0, 'FN': 0, 'TN': 0}
+    reasons = {}
+    local_times, lex_times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        keywords, reason = extractor.classify(query)
+        local_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        lex = keyword_set(lambda_function.extract_keywords_from_lex(query))
+        lex_times.append(time.perf_counter() - start)
+
+        if keywords is not None:
+            agrees = keyword_set(keywords) == lex
+            counts['TP' if agrees else 'FP'] += 1
+            if not agrees and show_disagreements:
+                print(f"DISAGREE {query!r}: local {keyword_set(keywords)}, Lex {lex}")
+        else:
+            reasons[reason] = reasons.get(reason, 0) + 1
+            # What plain label matching would have answered without the escalation rules
+            content = [word for word in tokenize(query) if word not in STOPWORDS]
+            matched = extractor.match(content, extractor.vocabulary.get()) if content else None
+            counts['FN' if matched is not None and keyword_set(matched) == lex else 'TN'] += 1
+
+    total = sum(counts.values())
+    answered = counts['TP'] + counts['FP']
+    agreeable = counts['TP'] + counts['FN']
+    return {
+        'queries': total,
+        'confusion': counts,
+        'precision': round(counts['TP'] / answered, 3) if answered else None,
+        'recall': round(counts['TP'] / agreeable, 3) if agreeable else None,
+        'coverage': round(answered / total, 3) if total else None,
+        'escalated': reasons,
+        'localMedianMs': round(statistics.median(local_times) * 1000, 3) if local_times else None,
+        'lexMedianMs': round(statistics.median(lex_times) * 1000, 1) if lex_times else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', nargs='?', help='File with one query per line (default: stdin)')
+    parser.add_argument('--vocabulary', help='JSON list of labels instead of the index aggregation')
+    parser.add_argument('--max-terms', type=int, default=LOCAL_EXTRACTOR_MAX_TERMS)
+    parser.add_argument('--dump-vocabulary', metavar='FILE', help='Write the index labels to FILE and exit')
+    parser.add_argument('--show-disagreements', action='store_true')
+    args = parser.parse_args()
+
+    if args.dump_vocabulary:
+        labels = lambda_function.fetch_label_vocabulary()
+        with open(args.dump_vocabulary, 'w') as f:
+            json.dump(sorted(labels), f, indent=1)
+        print(f"Wrote {len(labels)} labels to {args.dump_vocabulary}")
+        sys.exit(0)
+
+    # Every query must reach Lex to be compared
+    lambda_function.lex_memo = None
+    if args.vocabulary:
+        loader = lambda: load_vocabulary_file(args.vocabulary)  # noqa: E731
+    else:
+        loader = lambda_function.fetch_label_vocabulary
+    # Load before the first query so every query sees the vocabulary
+    extractor = LocalKeywordExtractor(LabelVocabulary(loader, background=False), args.max_terms)
+    with (open(args.queries) if args.queries else sys.stdin) as f:
+        queries = [line.strip() for line in f if line.strip()]
+    print(json.dumps(evaluate(queries, extractor, args.show_disagreements), indent=2))
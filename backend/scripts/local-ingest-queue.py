@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Drive the index-photos SQS mode from an in-memory queue stand-in.
+Messages are delivered in batches shaped like Lambda SQS events; messages
+reported in batchItemFailures are redelivered until maxReceiveCount, then
+moved to a dead-letter list. Useful for exercising partial batch failure
+handling without AWS queues.
+"""
+
+import argparse
+import json
+import os
+import sys
+import uuid
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+
+
+class LocalQueue:
+    """In-memory FIFO with SQS-style receive counts and a dead-letter list."""
+
+    def __init__(self, max_receive_count=3):
+        self.max_receive_count = max_receive_count
+        self.messages = deque()
+        self.dead_letters = []
+
+    def send(self, body):
+        self.messages.append({'messageId': str(uuid.uuid4()), 'body': body, 'receiveCount': 0})
+
+    def receive_batch(self, batch_size):
+        batch = []
+        while self.messages and len(batch) < batch_size:
+            message = self.messages.popleft()
+            message['receiveCount'] += 1
+            batch.append(message)
+        return batch
+
+    def to_lambda_event(self, batch):
+        return {
+            'Records': [
+                {
+                    'messageId': message['messageId'],
+                    'body': message['body'],
+                    'eventSource': 'aws:sqs',
+                    'attributes': {'ApproximateReceiveCount': str(message['receiveCount'])}
+                }
+                for message in batch
+            ]
+        }
+
+    def settle(self, batch, response):
+        """Delete successful messages; redeliver or dead-letter failures."""
+        failed_ids = {item['itemIdentifier'] for item in response.get('batchItemFailures', [])}
+        for message in batch:
+            if message['messageId'] not in failed_ids:
+                continue
+            if message['receiveCount'] >= self.max_receive_count:
+                self.dead_letters.append(message)
+            else:
+                self.messages.append(message)
+        return len(batch) - len(failed_ids)
+
+
+def s3_notification(bucket, key):
+    """Build the S3 notification body S3 would send to SQS."""
+    return json.dumps({
+        'Records': [{
+            'eventSource': 'aws:s3',
+            'eventName': 'ObjectCreated:Put',
+            's3': {'bucket': {'name': bucket}, 'object': {'key': key}}
+        }]
+    })
+
+
+def drain(queue, handler, batch_size):
+    """Deliver batches to handler until the queue is empty."""
+    delivered = 0
+    while queue.messages:
+        batch = queue.receive_batch(batch_size)
+        response = handler(queue.to_lambda_event(batch), None)
+        delivered += queue.settle(batch, response)
+        print(f"Batch of {len(batch)}: {len(response.get('batchItemFailures', []))} failed, "
+              f"{len(queue.messages)} queued, {len(queue.dead_letters)} dead-lettered")
+    return delivered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('bucket')
+    parser.add_argument('keys', nargs='+')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--max-receive-count', type=int, default=3)
+    args = parser.parse_args()
+
+    import lambda_function
+
+    queue = LocalQueue(args.max_receive_count)
+    for key in args.keys:
+        queue.send(s3_notification(args.bucket, key))
+    delivered = drain(queue, lambda_function.lambda_handler, args.batch_size)
+    print(f"Indexed {delivered} messages; dead letters: {[m['messageId'] for m in queue.dead_letters]}")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Manage the photos index: template, bulk-load mode and versioned migration.
+
+  template        install the explicit index template (--print shows it)
+  begin-bulk-load disable refresh and replicas before a large import
+  end-bulk-load   restore the saved settings, refresh and force-merge
+  migrate         copy the index into {alias}-v{N} with the current
+                  template and move the alias to it
+
+The original implicitly created index is a concrete index named like the
+alias; migrating away from it needs --replace-index, which deletes it in
+the same atomic step that creates the alias.
+
+Uses OPENSEARCH_ENDPOINT / OPENSEARCH_INDEX / OPENSEARCH_USERNAME /
+OPENSEARCH_PASSWORD and the INDEX_* settings from the environment.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+import index_manager  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', default=index_manager.OPENSEARCH_INDEX,
+                        help='Alias or index (default: OPENSEARCH_INDEX)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    template = commands.add_parser('template')
+    template.add_argument('--print', action='store_true', help='Print the template instead of installing it')
+    commands.add_parser('begin-bulk-load')
+    end = commands.add_parser('end-bulk-load')
+    end.add_argument('--no-force-merge', action='store_true')
+    migrate = commands.add_parser('migrate')
+    migrate.add_argument('--version', type=int, required=True, help='Creates {index}-v{version}')
+    migrate.add_argument('--replace-index', action='store_true',
+                         help='Delete a concrete index named like the alias when the alias is created')
+    migrate.add_argument('--no-copy', action='store_true', help='Switch the alias to an empty index')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.command == 'template':
+        if args.print:
+            print(json.dumps(index_manager.build_template(args.index), indent=2))
+        else:
+            index_manager.install_template(args.index)
+    elif args.command == 'begin-bulk-load':
+        index_manager.begin_bulk_load(args.index)
+    elif args.command == 'end-bulk-load':
+        index_manager.end_bulk_load(args.index, force_merge=not args.no_force_merge)
+    elif args.command == 'migrate':
+        try:
+            index_manager.migrate(args.version, args.index, args.replace_index, copy=not args.no_copy)
+        except index_manager.IndexStateError as e:
+            sys.exit(str(e))
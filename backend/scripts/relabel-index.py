@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Relabel only the documents whose labels are stale.
+
+A document is stale when its labelSignature (detector, model version,
+MaxLabels and MinConfidence) differs from the current one, or when it has
+none (indexed before signatures were recorded). The current model version
+is taken from --model-version or probed with one detection. Stale
+documents are selected with a single query and scrolled out; each is
+pre-checked like an upload and re-detected on a small worker pool (the
+detector is also paced by the shared AIMD limiter and --max-rate);
+objects the pre-check now rejects are skipped. The new labels are
+written back as bulk partial updates. Updates are conditional on the document's
+sequence number, so a photo re-uploaded during the run is never
+overwritten with labels of its previous content. Videos are left out:
+their labels come from sampled keyframes, so they are relabelled by
+re-ingesting them.
+
+Uses the same OPENSEARCH_* / REKOGNITION_* / LABEL_DETECTOR environment
+variables as the index-photos Lambda.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+import lambda_function  # noqa: E402
+
+REPORT_INTERVAL_SECONDS = 10
+
+
+def search(path, body):
+    status, response_body = lambda_function.send_opensearch_request(path, json.dumps(body).encode('utf-8'))
+    return json.loads(response_body)
+
+
+def current_signature(model_version):
+    return lambda_function.get_label_params(model_version)['labelSignature']
+
+
+def probe_model_version():
+    """Detect labels on one indexed photo to learn the current model version."""
+    result = search(f"/{lambda_function.OPENSEARCH_INDEX}/_search", {
+        "size": 1,
+        "_source": ["bucket", "objectKey"],
+        "query": {"bool": {"must_not": [{"term": {"deleted": True}}, {"term": {"mediaType": "video"}}]}}
+    })
+    hits = result['hits']['hits']
+    if not hits:
+        return None
+    source = hits[0]['_source']
+    try:
+        _, model_version = lambda_function.label_detector.detect(source['bucket'], source['objectKey'])
+    finally:
+        lambda_function.release_object_bytes(source['bucket'], source['objectKey'])
+    return model_version
+
+
+def stale_query(signature):
+    # Tombstones of deleted photos have no signature but nothing to relabel;
+    # video labels are aggregated over keyframes and need a re-ingest instead
+    return {"bool": {"must_not": [
+        {"term": {"labelSignature.keyword": signature}},
+        {"term": {"deleted": True}},
+        {"term": {"mediaType": "video"}}
+    ]}}
+
+
+def scroll_stale(signature, page_size):
+    """Yield (bucket, objectKey, seq_no, primary_term) for stale documents."""
+    result = search(f"/{lambda_function.OPENSEARCH_INDEX}/_search?scroll=10m", {
+        "size": page_size,
+        "_source": ["bucket", "objectKey"],
+        "seq_no_primary_term": True,
+        "query": stale_query(signature)
+    })
+    while result['hits']['hits']:
+        for hit in result['hits']['hits']:
+            yield hit['_source']['bucket'], hit['_source']['objectKey'], hit['_seq_no'], hit['_primary_term']
+        result = search("/_search/scroll", {"scroll": "10m", "scroll_id": result['_scroll_id']})
+
+
+def count_stale(signature):
+    result = search(f"/{lambda_function.OPENSEARCH_INDEX}/_count", {"query": stale_query(signature)})
+    return result['count']
+
+
+def run_relabel(signature, workers, batch_size, page_size, max_rate, dry_run):
+    total = count_stale(signature)
+    print(f"{total} stale documents (current signature {signature})")
+    if dry_run or not total:
+        return
+
+    done = failed = skipped = 0
+    updates = []
+    started = last_report = time.time()
+
+    def relabel(bucket, object_key, seq_no, primary_term):
+        try:
+            return lambda_function.build_label_update(bucket, object_key, seq_no, primary_term), None
+        except lambda_function.ObjectSkipped as e:
+            lambda_function.log_skip(bucket, object_key, e)
+            return None, None
+        except Exception as e:
+            return {'objectKey': object_key}, str(e)
+
+    def flush():
+        nonlocal done, failed
+        if updates:
+            errors = lambda_function.bulk_index_documents(updates)
+            done += len(updates) - len(errors)
+            failed += len(errors)
+            updates.clear()
+
+    def consume(future):
+        nonlocal failed, skipped, last_report
+        update, error = future.result()
+        if error:
+            failed += 1
+            print(f"Failed to relabel {update['objectKey']}: {error}", file=sys.stderr)
+        elif update is None:
+            skipped += 1
+        else:
+            updates.append(update)
+        if len(updates) >= batch_size:
+            flush()
+        if time.time() - last_report >= REPORT_INTERVAL_SECONDS:
+            last_report = time.time()
+            rate = done / max(last_report - started, 1e-6)
+            print(f"{done}/{total} relabelled, {failed} failed, {skipped} skipped, {rate:.1f} photos/s", flush=True)
+
+    interval = 1.0 / max_rate if max_rate else 0
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for stale in scroll_stale(signature, page_size):
+            if interval:
+                time.sleep(interval)
+            in_flight.append(executor.submit(relabel, *stale))
+            while len(in_flight) >= workers * 4 or (in_flight and in_flight[0].done()):
+                consume(in_flight.popleft())
+        while in_flight:
+            consume(in_flight.popleft())
+
+    flush()
+    print(f"Relabel complete: {done} updated, {failed} failed, {skipped} skipped in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', help='Target index (default: OPENSEARCH_INDEX)')
+    parser.add_argument('--model-version', help='Current model version (default: probe with one detection)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-rate', type=float, default=5.0, help='Max detections per second (0: unlimited)')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Only count stale documents')
+    args = parser.parse_args()
+
+    if args.index:
+        lambda_function.OPENSEARCH_INDEX = args.index
+    model_version = args.model_version or probe_model_version()
+    if model_version is None:
+        sys.exit("Index is empty; nothing to relabel")
+    run_relabel(current_signature(model_version), args.workers, args.batch_size,
+                args.page_size, args.max_rate, args.dry_run)
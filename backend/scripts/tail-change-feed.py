@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tail the index change feed from a stored offset.
+
+Prints change records written by index-photos (one JSON object per line)
+after the offset kept in --offset-file, then saves the new offset so the
+next run continues where this one stopped. With --follow the feed is
+polled until interrupted. Segments younger than CHANGE_FEED_SETTLE_SECONDS
+are held back, so records from concurrent writers are delivered in segment
+order and none are skipped.
+
+Uses the same CHANGE_FEED_* environment variables as the index-photos Lambda.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'index-photos'))
+from change_feed import CHANGE_FEED_BACKEND, create_segment_store, read_changes  # noqa: E402
+
+
+def load_offset(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return f.read().strip() or None
+    return None
+
+
+def save_offset(path, offset):
+    if not path or offset is None:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(offset)
+    os.replace(tmp_path, path)
+
+
+def tail(store, offset_file, offset, limit, follow, poll_seconds):
+    offset = offset or load_offset(offset_file)
+    while True:
+        records, offset = read_changes(store, offset, limit)
+        for record in records:
+            print(json.dumps(record), flush=True)
+        save_offset(offset_file, offset)
+        if len(records) < limit:
+            if not follow:
+                return
+            time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=CHANGE_FEED_BACKEND,
+                        help='Segment store: local or s3 (default: CHANGE_FEED_BACKEND)')
+    parser.add_argument('--offset-file', default='change-feed-offset.txt',
+                        help='Where the consumer offset is kept')
+    parser.add_argument('--offset', help="Start from this 'segment:line' offset instead of the offset file")
+    parser.add_argument('--limit', type=int, default=1000, help='Records read per poll')
+    parser.add_argument('--follow', action='store_true', help='Keep polling for new records')
+    parser.add_argument('--poll-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    store = create_segment_store(args.backend)
+    if store is None:
+        sys.exit("Change feed is disabled; set CHANGE_FEED_BACKEND or --backend")
+    try:
+        tail(store, args.offset_file, args.offset, args.limit, args.follow, args.poll_seconds)
+    except KeyboardInterrupt:
+        pass
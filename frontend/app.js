@@ -98,8 +98,8 @@ async function handleUpload(event) {
     }
 
     // Validate file type
-    if (!file.type.startsWith('image/')) {
-        showError('Please select an image file');
+    if (!file.type.startsWith('image/') && !VIDEO_TYPES.includes(file.type)) {
+        showError('Please select an image or an MP4/MOV video');
         return;
     }
 
@@ -172,11 +172,33 @@ function createPhotoCard(photo) {
     const card = document.createElement('div');
     card.className = 'photo-card';
     
-    // Create image URL from S3 bucket and key
-    const imageUrl = `https://${photo.bucket}.s3.amazonaws.com/${photo.objectKey}`;
+    if (photo.mediaType === 'video') {
+        card.innerHTML = `
+            <video src="${getS3Url(photo.bucket, photo.objectKey)}" preload="metadata" muted controls></video>
+            ${createPhotoInfo(photo)}
+        `;
+        return card;
+    }
+    
+    // Prefer the smallest rendition for src and let the browser pick from srcset;
+    // fall back to the original for photos indexed without derivatives
+    const imageUrl = getThumbnailUrl(photo);
+    const srcset = getSrcset(photo, 'jpeg');
+    const webpSrcset = getSrcset(photo, 'webp');
     
     card.innerHTML = `
-        <img src="${imageUrl}" alt="${photo.objectKey}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=\'http://www.w3.org/2000/svg\' width=\'200\' height=\'200\'%3E%3Crect width=\'200\' height=\'200\' fill=\'%23ddd\'/%3E%3Ctext x=\'50%25\' y=\'50%25\' text-anchor=\'middle\' dy=\'.3em\' fill=\'%23999\'%3EImage not available%3C/text%3E%3C/svg%3E'">
+        <picture>
+            ${webpSrcset ? `<source type="image/webp" srcset="${webpSrcset}" sizes="${THUMBNAIL_SIZES}">` : ''}
+            <img src="${imageUrl}" ${srcset ? `srcset="${srcset}" sizes="${THUMBNAIL_SIZES}"` : ''} loading="lazy" alt="${photo.objectKey}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=\'http://www.w3.org/2000/svg\' width=\'200\' height=\'200\'%3E%3Crect width=\'200\' height=\'200\' fill=\'%23ddd\'/%3E%3Ctext x=\'50%25\' y=\'50%25\' text-anchor=\'middle\' dy=\'.3em\' fill=\'%23999\'%3EImage not available%3C/text%3E%3C/svg%3E'">
+        </picture>
+        ${createPhotoInfo(photo)}
+    `;
+    
+    return card;
+}
+
+function createPhotoInfo(photo) {
+    return `
         <div class="photo-info">
             <div class="photo-name">${escapeHtml(photo.objectKey)}</div>
             <div class="photo-date">Uploaded: ${formatDate(photo.createdTimestamp)}</div>
@@ -188,8 +210,39 @@ function createPhotoCard(photo) {
             </div>
         </div>
     `;
-    
-    return card;
+}
+
+// Video clips accepted for upload (indexed from sampled keyframes)
+const VIDEO_TYPES = ['video/mp4', 'video/quicktime'];
+
+// Rendered width of a photo card, used to pick a rendition from srcset
+const THUMBNAIL_SIZES = '(max-width: 600px) 100vw, 300px';
+
+function getS3Url(bucket, key) {
+    return `https://${bucket}.s3.amazonaws.com/${key}`;
+}
+
+// Renditions live in their own bucket unless written next to the original
+function getDerivativesBucket(photo) {
+    return photo.derivativesBucket || photo.bucket;
+}
+
+function getThumbnailUrl(photo) {
+    const widths = Object.keys(photo.derivatives || {}).map(Number).sort((a, b) => a - b);
+    for (const width of widths) {
+        const rendition = photo.derivatives[width];
+        if (rendition.jpeg) {
+            return getS3Url(getDerivativesBucket(photo), rendition.jpeg);
+        }
+    }
+    return getS3Url(photo.bucket, photo.objectKey);
+}
+
+function getSrcset(photo, format) {
+    return Object.entries(photo.derivatives || {})
+        .filter(([, rendition]) => rendition[format])
+        .map(([width, rendition]) => `${getS3Url(getDerivativesBucket(photo), rendition[format])} ${width}w`)
+        .join(', ');
 }
 
 function showError(message) {